@@ -0,0 +1,3 @@
+# PyInstaller runtime hook: the bundle folder is not writable, numba must
+# cache the compiled functions in the user cache folder, set before numba loads
+import numbaCache
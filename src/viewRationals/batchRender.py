@@ -0,0 +1,336 @@
+import numbaCache
+import sys
+import json
+import argparse
+import tempfile
+from time import time
+from copy import deepcopy
+from multiprocessing import freeze_support, Manager, cpu_count
+from threading import Event
+import numpy as np
+from gc import collect
+
+from madcad import vec3, fvec3, settings
+from config import config
+from color import ColorLine, _convert_color
+from views import ViewRender
+from getObjects import get_objects
+from spacetime_numba import SpaceTime, space_to_arrays, save_slices, estimate_memory, fit_max_time, available_memory
+from saveImages import _saveImages, _create_video, _del_folder, _get_frame_range
+from utils import getDivisorsAndFactors, getSpecials, getFactorsLabel, getCycles
+from timing import span, count, enable_trace, save_trace, get_summary
+
+settings_file = 'settings.txt'
+
+# valores por defecto de un job, las claves que falten en el fichero
+# json o en la linea de comandos se toman de aqui
+default_job = {
+    'dims': [3],
+    'periods': [],
+    'init_period': 0,
+    'end_period': 0,
+    'period_step': 1,
+    'numbers': 'specials',
+    'max_number': 1650000,
+    'exclude_periods': {'3': [46, 47, 48]},
+    'max_time': 0,
+    'accumulate': False,
+    'view': '',
+    'init_time': 0,
+    'end_time': 0,
+    'num_frames': 1,
+    'fps': 1.0,
+    'turn_angle': 0,
+    'camera': {},
+    'resx': config.get('image_resx'),
+    'resy': config.get('image_resy'),
+    'legend': config.get('image_legend'),
+    'histogram': config.get('image_histogram'),
+    'view_objects': True,
+    'view_time': False,
+    'view_next_number': False,
+    'image_path': config.get('image_path'),
+    'video_path': config.get('video_path'),
+    'subfolder': '',
+    'prefix': '',
+    'suffix': '',
+    'clean_images': True,
+    'num_cpus': cpu_count(),
+    'stream': config.get('video_stream'),
+    'resume': False,
+}
+
+
+def load_job(file_name=None, overrides=None):
+    """Returns the job spec in file_name completed with the defaults, overrides take precedence."""
+    job = deepcopy(default_job)
+    if file_name:
+        with open(file_name, 'rt') as fp:
+            values = json.load(fp)
+        for key in values.keys():
+            if key not in job:
+                print(f'------- WARNING: unknown job key {key}')
+                continue
+            job[key] = values[key]
+    for key, value in (overrides or {}).items():
+        if value is not None:
+            job[key] = value
+    return job
+
+
+def get_periods(job):
+    if job['periods']:
+        return list(job['periods'])
+    if job['init_period'] and job['end_period']:
+        return list(range(job['init_period'], job['end_period'] + 1, job['period_step']))
+    return []
+
+
+def get_tasks(job):
+    """
+    Expands a job into its tasks, one per (dim, period, number), in the
+    order the specials batch of the main window saves them.
+    """
+    tasks = []
+    for dim in job['dims']:
+        base = int(2 ** dim)
+        excluded = job['exclude_periods'].get(str(dim), [])
+        for period in get_periods(job):
+            if period in excluded:
+                continue
+            numbers = getDivisorsAndFactors(base**period - 1, base)
+            specials = getSpecials(dim, period)
+            if job['numbers'] == 'specials':
+                selected = [x for x in numbers.keys() if numbers[x]['period'] == period and x in specials]
+            else:
+                selected = [x for x in job['numbers'] if x in numbers]
+            for number in selected:
+                if job['max_number'] and number > job['max_number']:
+                    continue
+                tasks.append({
+                    'dim': dim,
+                    'period': period,
+                    'number': number,
+                    'is_special': numbers[number]['period'] == period and number in specials,
+                    'factors': getFactorsLabel(numbers[number]['factors']),
+                    'max_time': job['max_time'] or period * getCycles(period),
+                })
+    return tasks
+
+
+def get_colors():
+    color = ColorLine()
+    colors = config.get('colors')
+    if colors:
+        for knot in colors:
+            color.add(knot['alpha'], vec3(*knot['color']))
+    return color
+
+
+def check_memory(task):
+    """
+    Reduces the max time of task, in whole periods, when its estimated memory
+    does not fit in the available one. Raises MemoryError if no time fits.
+    """
+    available = available_memory()
+    if available is None:
+        return
+    dim = task['dim']
+    period = task['period']
+    limit = int(available * config.get('memory_limit_fraction'))
+    estimate = estimate_memory(dim, period, task['number'], task['max_time'], task['is_special'])['total']
+    if estimate <= limit:
+        return
+    fit = fit_max_time(dim, period, task['number'], task['max_time'], limit, task['is_special'])
+    if not fit:
+        raise MemoryError(f'number {task["number"]} needs about {estimate / 2**20:,.0f} MB, available {available / 2**20:,.0f} MB')
+    print(f'------- WARNING: number {task["number"]} needs about {estimate / 2**20:,.0f} MB, max time reduced from {task["max_time"]} to {fit}')
+    task['max_time'] = fit
+
+
+def compute(task, spacetime=None):
+    """Computes the spacetime of a task, reusing spacetime when it has the same dimensions."""
+    check_memory(task)
+    dim = task['dim']
+    period = task['period']
+    num = 2**(dim * period) - 1
+    if spacetime is None:
+        spacetime = SpaceTime(period, num, task['max_time'], dim)
+    elif (spacetime.T, spacetime.max_val, spacetime.dim) != (period, task['max_time'], dim):
+        spacetime.reset(period, num, task['max_time'], dim)
+    spacetime.clear()
+    with span('setRationalSet', number=task['number']):
+        spacetime.setRationalSet(task['number'], task['is_special'])
+    count('rationals', spacetime.get_rational_count())
+    with span('addRationalSet', number=task['number']):
+        count('paths', spacetime.addRationalSet(0, 0, 0, 0))
+    return spacetime
+
+
+def get_camera(job, task, spacetime, view_type, color, end_time):
+    """
+    Default camera of the view centered and adjusted to the objects at
+    end_time, then the angles, distance, center and fov given in the job.
+    """
+    accumulate = job['accumulate']
+    view_cells = space_to_arrays(spacetime, end_time, accumulate)
+    objs, _, _ = get_objects(
+        view_cells, task['number'], task['dim'], accumulate, config, color,
+        job['view_objects'], job['view_time'], job['view_next_number'],
+        task['max_time'], end_time, spacetime.getMaxTime(accumulate)
+    )
+    view = ViewRender(view_type)
+    projection, navigation = view.fit(job['resx'], job['resy'], objs)
+    projection = deepcopy(projection)
+    navigation = deepcopy(navigation)
+    del view
+    del objs
+
+    camera = job['camera']
+    if 'yaw' in camera:
+        navigation.yaw = np.deg2rad(camera['yaw'])
+    if 'pitch' in camera:
+        navigation.pitch = np.deg2rad(camera['pitch'])
+    if 'distance' in camera:
+        navigation.distance = camera['distance']
+    if 'center' in camera:
+        navigation.center = fvec3(*camera['center'])
+    if 'fov' in camera and hasattr(projection, 'fov'):
+        projection.fov = np.deg2rad(camera['fov'])
+    return projection, navigation
+
+
+def render_task(job, task, spacetime, manager):
+    """Renders the image or video of a computed task, as saveImage/saveVideo do from the main window."""
+    dim_str = ['1D', '2D', '3D'][task['dim'] - 1]
+    view_type = job['view'] or dim_str
+    accumulate = job['accumulate']
+    max_time = task['max_time']
+    color = get_colors()
+
+    if job['num_frames'] == 1:
+        frame = job['end_time'] or max_time
+        init_frame, end_frame, num_frames, single_image = frame, frame, 1, True
+    else:
+        init_frame, end_frame, num_frames, single_image = _get_frame_range(
+            job['init_time'], job['end_time'], job['num_frames'], job['fps'], max_time, accumulate, job['turn_angle']
+        )
+    if end_frame > max_time:
+        print(f'------- ERROR: end time {end_frame} is greater than max time {max_time}')
+        return False
+
+    projection, navigation = get_camera(job, task, spacetime, view_type, color, end_frame)
+    shr_projection = manager.Value(type(projection), projection)
+    shr_navigation = manager.Value(type(navigation), navigation)
+    shr_num_video_frames = manager.Value(int, 0)
+
+    slices_path = tempfile.mkdtemp(prefix='viewRationals_')
+    last_frame = min(end_frame + 1, max_time)
+    with span('save_slices'):
+        count('bytes_slices', save_slices(spacetime, accumulate, None, slices_path, range(init_frame, last_frame + 1)))
+
+    args = (
+        shr_projection, shr_navigation, job['image_path'],
+        init_frame, end_frame, job['fps'],
+        job['subfolder'], job['prefix'], job['suffix'],
+        num_frames, job['turn_angle'], config,
+        color, view_type, slices_path,
+        task['dim'], task['number'], task['period'], task['factors'],
+        accumulate, dim_str,
+        job['view_objects'], job['view_time'], job['view_next_number'],
+        max_time, shr_num_video_frames, job['clean_images'],
+        None, None, job['num_cpus'],
+        job['legend'], job['resx'], job['resy'],
+        job['stream'], job['resume'], Event()
+    )
+    try:
+        pool, args_video, _ = _saveImages(args)
+        pool.close()
+        pool.join()
+        if not single_image and args_video:
+            _create_video(args_video)
+    finally:
+        _del_folder(slices_path)
+    return True
+
+
+def init_render(job):
+    """Loads the render settings of the process that computes the tasks of job."""
+    settings.load(settings_file)
+    settings.display['background_color'] = vec3(*_convert_color(config.get('background_color')))
+    config.values['video_path'] = job['video_path']
+    config.values['image_histogram'] = job['histogram']
+    enable_trace(config.get('trace_path'))
+
+
+def run_job(job):
+    """Computes and renders every task of job, returns the number of tasks that failed."""
+    init_render(job)
+
+    tasks = get_tasks(job)
+    print(f'------- {len(tasks)} tasks')
+    manager = Manager()
+    spacetime = None
+    errors = 0
+    for index, task in enumerate(tasks):
+        time1 = time()
+        print(f'------- [{index + 1}/{len(tasks)}] dim: {task["dim"]} period: {task["period"]} number: {task["number"]}')
+        try:
+            spacetime = compute(task, spacetime)
+            if not render_task(job, task, spacetime, manager):
+                errors += 1
+                continue
+        except Exception as e:
+            print(f'------- ERROR rendering number {task["number"]}: {str(e)}')
+            errors += 1
+            continue
+        finally:
+            collect()
+        print(f'------- number {task["number"]} saved in {time() - time1:,.2f} secs')
+        print(f'------- {get_summary()}')
+    manager.shutdown()
+    save_trace()
+    return errors
+
+
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Compute and render rational numbers without the main window.')
+    parser.add_argument('job', nargs='?', help='json file with the job spec, see default_job')
+    parser.add_argument('--dims', type=int, nargs='+')
+    parser.add_argument('--periods', type=int, nargs='+')
+    parser.add_argument('--numbers', type=int, nargs='+', help='numbers to render, all the specials if not given')
+    parser.add_argument('--max-time', type=int)
+    parser.add_argument('--accumulate', action='store_true', default=None)
+    parser.add_argument('--view', choices=['1D', '2D', '3D'])
+    parser.add_argument('--init-time', type=int)
+    parser.add_argument('--end-time', type=int)
+    parser.add_argument('--num-frames', type=int, help='1 for a single image, 0 for one frame per time and fps')
+    parser.add_argument('--fps', type=float)
+    parser.add_argument('--turn-angle', type=int)
+    parser.add_argument('--resx', type=int)
+    parser.add_argument('--resy', type=int)
+    parser.add_argument('--image-path')
+    parser.add_argument('--video-path')
+    parser.add_argument('--subfolder')
+    parser.add_argument('--num-cpus', type=int)
+    parser.add_argument('--histogram', action='store_true', default=None, help='paste the histogram of each time in the frames')
+    parser.add_argument('--stream', action='store_true', default=None)
+    parser.add_argument('--resume', action='store_true', default=None)
+    parser.add_argument('--list', action='store_true', help='only print the tasks of the job')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+    overrides = {key: value for key, value in vars(args).items() if key not in ('job', 'list')}
+    job = load_job(args.job, overrides)
+    if args.list:
+        for task in get_tasks(job):
+            print(json.dumps(task))
+        return 0
+    return 1 if run_job(job) else 0
+
+
+if __name__ == '__main__':
+    freeze_support()
+    sys.exit(main())
@@ -0,0 +1,252 @@
+import numbaCache
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import platform
+from time import perf_counter
+from multiprocessing import freeze_support, get_context
+
+from spacetime_numba import SpaceTime, space_to_arrays, save_slices, load_slice, warmup, check_whole_periods
+
+baseline_file = 'benchmark_baseline.json'
+
+# escenarios fijos, de menor a mayor; 'quick' es el subconjunto para comprobaciones rapidas
+scenarios = [
+    {'name': '1D_T08_special',     'dim': 1, 'period': 8,  'number': 17,     'is_special': True,  'quick': True},
+    {'name': '1D_T08_not_special', 'dim': 1, 'period': 8,  'number': 255,    'is_special': False, 'quick': True},
+    {'name': '1D_T04_transform',   'dim': 1, 'period': 4,  'number': 15,     'is_special': True,  'quick': True,
+     'transform': (4, 1, 0, 0)},
+    {'name': '1D_T12_not_special', 'dim': 1, 'period': 12, 'number': 4095,   'is_special': False, 'quick': True},
+    {'name': '1D_T16_special',     'dim': 1, 'period': 16, 'number': 257,    'is_special': True,  'quick': False},
+    {'name': '2D_T04_special',     'dim': 2, 'period': 4,  'number': 17,     'is_special': True,  'quick': True},
+    {'name': '2D_T04_not_special', 'dim': 2, 'period': 4,  'number': 85,     'is_special': False, 'quick': True},
+    {'name': '2D_T06_not_special', 'dim': 2, 'period': 6,  'number': 4095,   'is_special': False, 'quick': True},
+    {'name': '2D_T08_special',     'dim': 2, 'period': 8,  'number': 257,    'is_special': True,  'quick': False},
+    {'name': '3D_T04_special',     'dim': 3, 'period': 4,  'number': 65,     'is_special': True,  'quick': True},
+    {'name': '3D_T04_not_special', 'dim': 3, 'period': 4,  'number': 4095,   'is_special': False, 'quick': True},
+    {'name': '3D_T06_special',     'dim': 3, 'period': 6,  'number': 513,    'is_special': True,  'quick': False},
+]
+
+stages = ['setRationalSet', 'addRationalSet', 'getCells', 'arrays', 'get_objects', 'save', 'load']
+
+
+def _peak_rss_mb():
+    """Peak resident memory of this process in MB, None if it can not be read."""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+    except ImportError:
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().peak_wset / 1024 / 1024
+    except (ImportError, AttributeError):
+        return None
+
+
+def _get_objects_builder():
+    """get_objects needs madcad, the stage is skipped when it is not installed."""
+    try:
+        from getObjects import get_objects
+        from color import ColorLine
+        from config import config
+        from madcad import vec3
+    except ImportError as e:
+        print(f'------- get_objects stage skipped: {str(e)}')
+        return None
+    color = ColorLine()
+    for knot in config.get('colors'):
+        color.add(knot['alpha'], vec3(*knot['color']))
+
+    def build(view_cells, scenario, t, max_time, max_spaces_time):
+        return get_objects(view_cells, scenario['number'], scenario['dim'], False, config, color,
+                           True, False, False, max_time, t, max_spaces_time)
+    return build
+
+
+def run_scenario(scenario):
+    """Runs the compute pipeline of a scenario, returns {stage: secs} plus sizes and peak memory."""
+    dim = scenario['dim']
+    period = scenario['period']
+    max_time = scenario.get('max_time', period * 4)
+    result = {'name': scenario['name'], 'times': {}}
+    times = result['times']
+
+    spacetime = SpaceTime(period, 2**(dim * period) - 1, max_time, dim)
+    if 'transform' in scenario:
+        n, mx, my, mz = scenario['transform']
+        if spacetime.transform.set_velocity(dim, n, mx, my, mz) != 0:
+            result['error'] = 'invalid transform'
+            return result
+        spacetime.transform.set_input_plugin(0)
+        spacetime.transform.set_output_plugin(0)
+    spacetime.clear()
+
+    time1 = perf_counter()
+    spacetime.setRationalSet(scenario['number'], scenario['is_special'])
+    times['setRationalSet'] = perf_counter() - time1
+
+    time1 = perf_counter()
+    result['paths'] = spacetime.addRationalSet(0, 0, 0, 0)
+    times['addRationalSet'] = perf_counter() - time1
+
+    time1 = perf_counter()
+    result['cells'] = sum(len(spacetime.getCells(t, False)) for t in range(max_time + 1))
+    times['getCells'] = perf_counter() - time1
+
+    time1 = perf_counter()
+    arrays = [space_to_arrays(spacetime, t, False) for t in range(max_time + 1)]
+    times['arrays'] = perf_counter() - time1
+
+    build = _get_objects_builder()
+    if build is not None:
+        max_spaces_time = spacetime.getMaxTime(False)
+        time1 = perf_counter()
+        for t in range(max_time + 1):
+            build(arrays[t], scenario, t, max_time, max_spaces_time)
+        times['get_objects'] = perf_counter() - time1
+    del arrays
+
+    folder = tempfile.mkdtemp(prefix='viewRationals_bench_')
+    try:
+        time1 = perf_counter()
+        result['bytes'] = save_slices(spacetime, False, None, folder, range(max_time + 1))
+        times['save'] = perf_counter() - time1
+        time1 = perf_counter()
+        for t in range(max_time + 1):
+            loaded = load_slice(folder, t)
+            loaded['count'].sum()
+        times['load'] = perf_counter() - time1
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+    result['paths_per_sec'] = result['paths'] / times['addRationalSet'] if times['addRationalSet'] else 0.0
+    result['peak_rss_mb'] = _peak_rss_mb()
+    return result
+
+
+def _run_isolated(scenario, queue):
+    # en un proceso nuevo la memoria pico es solo la del escenario;
+    # se compila antes para no medir el JIT
+    warmup()
+    queue.put(run_scenario(scenario))
+
+
+def run(names=None, quick=False, isolate=True):
+    selected = [s for s in scenarios if (not names or s['name'] in names) and (not quick or s['quick'])]
+    results = {}
+    if not isolate:
+        warmup()
+    ctx = get_context('spawn')
+    for scenario in selected:
+        print(f'------- running {scenario["name"]}...')
+        if isolate:
+            queue = ctx.Queue()
+            process = ctx.Process(target=_run_isolated, args=(scenario, queue))
+            process.start()
+            result = queue.get()
+            process.join()
+        else:
+            result = run_scenario(scenario)
+        results[scenario['name']] = result
+        _print_result(result)
+    return {
+        'machine': {'platform': platform.platform(), 'python': platform.python_version(), 'cpus': os.cpu_count()},
+        'isolated': isolate,
+        'results': results,
+    }
+
+
+def _print_result(result):
+    if 'error' in result:
+        print(f'    {result["name"]}: ERROR {result["error"]}')
+        return
+    stage_times = ' '.join(f'{stage}: {result["times"][stage]:.3f}s' for stage in stages if stage in result['times'])
+    peak = f'{result["peak_rss_mb"]:.0f} MB' if result['peak_rss_mb'] is not None else '?'
+    print(f'    paths: {result["paths"]:,} cells: {result["cells"]:,} {result["paths_per_sec"]:,.0f} paths/s peak: {peak}')
+    print(f'    {stage_times}')
+
+
+def check(names=None, quick=False):
+    """Cross-checks the whole period fill with the simulation, returns the scenarios that differ."""
+    failed = []
+    for scenario in scenarios:
+        if (names and scenario['name'] not in names) or (quick and not scenario['quick']) or 'transform' in scenario:
+            continue
+        period = scenario['period']
+        differences = check_whole_periods(
+            period, scenario.get('max_time', period * 4), scenario['dim'], scenario['number'], scenario['is_special']
+        )
+        print(f'------- check {scenario["name"]}: {"OK" if not differences else differences}')
+        if differences:
+            failed.append(scenario['name'])
+    return failed
+
+
+def compare(current, baseline, tolerance=0.2):
+    """Returns the list of regressions: stages slower or peaks bigger than the baseline by more than tolerance."""
+    regressions = []
+    for name, result in current['results'].items():
+        base = baseline['results'].get(name)
+        if not base or 'error' in result or 'error' in base:
+            continue
+        for stage, secs in result['times'].items():
+            base_secs = base['times'].get(stage)
+            # tiempos muy pequeños son ruido
+            if base_secs and secs > 0.01 and secs > base_secs * (1 + tolerance):
+                regressions.append(f'{name} {stage}: {secs:.3f}s vs {base_secs:.3f}s')
+        if result.get('peak_rss_mb') and base.get('peak_rss_mb') and current['isolated'] and baseline['isolated']:
+            if result['peak_rss_mb'] > base['peak_rss_mb'] * (1 + tolerance):
+                regressions.append(f'{name} peak rss: {result["peak_rss_mb"]:.0f} MB vs {base["peak_rss_mb"]:.0f} MB')
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark of the numba compute pipeline.')
+    parser.add_argument('scenarios', nargs='*', help='names of the scenarios to run, all if not given')
+    parser.add_argument('--quick', action='store_true', help='only the quick scenarios')
+    parser.add_argument('--no-isolate', action='store_true', help='run every scenario in this process, peak memory is not per scenario')
+    parser.add_argument('--baseline', default=baseline_file, help='json file of the stored baseline')
+    parser.add_argument('--save-baseline', action='store_true', help='store the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    parser.add_argument('--output', help='json file for the results')
+    parser.add_argument('--list', action='store_true', help='print the scenarios')
+    parser.add_argument('--check', action='store_true', help='compare the whole period fill with the simulation')
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for scenario in scenarios:
+            print(json.dumps(scenario))
+        return 0
+    if args.check:
+        return 1 if check(args.scenarios, args.quick) else 0
+
+    current = run(args.scenarios, args.quick, not args.no_isolate)
+    if args.output:
+        with open(args.output, 'wt') as fp:
+            json.dump(current, fp, indent=4)
+    if args.save_baseline:
+        with open(args.baseline, 'wt') as fp:
+            json.dump(current, fp, indent=4)
+        print(f'------- baseline saved in {args.baseline}')
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f'------- no baseline in {args.baseline}, run with --save-baseline to create it')
+        return 0
+    with open(args.baseline, 'rt') as fp:
+        baseline = json.load(fp)
+    regressions = compare(current, baseline, args.tolerance)
+    for regression in regressions:
+        print(f'------- REGRESSION {regression}')
+    if not regressions:
+        print('------- no regressions')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    freeze_support()
+    sys.exit(main())
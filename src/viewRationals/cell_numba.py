@@ -5,6 +5,9 @@ import numpy as np
 
 from hashrationals_numba import HashRationals, hash_size
 
+# bytes aproximados de una celda sin su array next_digits ni sus racionales
+cell_bytes = 160
+
 # obtiene el diccionario de la celda
 def get_cell_dict(cell):
     # Convertimos el array de next_digits a un diccionario
@@ -53,6 +56,14 @@ class Cell:
         self.next_digits[next_digit] += count
         self.rationals.add(m)  # Usa el método de HashRationals (2 parámetros)
 
+    def add_group(self, count, time, ms, next_digits):
+        # suma de una vez las rutas de varios racionales que caen en la celda
+        self.count += count
+        self.time += time
+        self.next_digits += next_digits
+        for m in ms:
+            self.rationals.add(m)
+
     def clear(self):
         self.count = 0
         self.time = 0.0
@@ -77,6 +88,18 @@ class Cell:
         rationals.sort()
         return rationals
 
+    def count_rationals(self, rationals_array):
+        """Cuenta cuantos racionales de rationals_array estan en la celda."""
+        count = 0
+        for i in range(len(rationals_array)):
+            if self.rationals.contains(rationals_array[i]):
+                count += 1
+        return count
+
+    def memory(self):
+        """Approximate bytes used by the cell, (own, rationals)."""
+        return cell_bytes + self.next_digits.nbytes, self.rationals.memory()
+
     def set(self, count, time, next_digits_array):
         self.count = count
         self.time = time
@@ -1,4 +1,5 @@
 from copy import copy
+import numpy as np
 from madcad import vec3
 from madcad.mathutils import lerp
 
@@ -59,3 +60,12 @@ class ColorLine:
                 )
                 return color
         return vec3(1)
+
+    def getColors(self, alphas):
+        """getColor of every alpha of an array, as an (n, 3) float array."""
+        self.normalize()
+        knot_alphas = [knot.alpha for knot in self.knots]
+        return np.stack([
+            np.interp(alphas, knot_alphas, [knot.value[i] for knot in self.knots])
+            for i in range(3)
+        ], axis=1)
@@ -14,11 +14,17 @@ class Config:
             'image_resx': 1920,
             'image_resy': 1080,
             'image_legend': False,
+            'tile_size': 4096,
+            'image_histogram': False,
+            'image_histogram_resx': 480,
+            'image_histogram_resy': 120,
             'video_codec': 'prores',
             'video_format': 'mov',
             'frame_rate': 25.0,
             'frame_rate_accum': 0.5,
             'bit_rate': '20M',
+            'video_stream': False,
+            'video_ring_slots': 16,
             'colors': [
                 {'alpha': 0.0, 'color': [0.2, 0.2, 1.0]},
                 {'alpha': 0.5, 'color': [0.3, 0.6, 0.5]},
@@ -47,7 +53,11 @@ class Config:
             'list_color_not_period_prime': [1.0, 0.0, 1.0],
             'list_color_period_special': [0.0, 1.0, 1.0],
             'list_color_period_not_special': [0.0, 0.0, 1.0],
-            'spacetime_algorithm': 2
+            'spacetime_algorithm': 2,
+            'objects_cache_size': 12,
+            'prefetch_frames': 2,
+            'trace_path': '',
+            'memory_limit_fraction': 0.8
         }
         if os.path.exists(config_file):
             with open(config_file, 'rt') as fp:
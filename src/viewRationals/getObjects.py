@@ -9,31 +9,22 @@ from utils import get_alpha
 from color import _convert_color
 
 
-def _get_next_number_dir(dim, cell):
-    next_digits = cell['next_digits']
-    if dim == 1:
-        v1 = np.array([ 1,  0,  0]) * next_digits[0]
-        v2 = np.array([-1,  0,  0]) * next_digits[1]
-        v = (v1 + v2) / 2.0
-    elif dim == 2:
-        v1 = np.array([ 1,  0,  1]) * next_digits[0]
-        v2 = np.array([-1,  0,  1]) * next_digits[1]
-        v3 = np.array([ 1,  0, -1]) * next_digits[2]
-        v4 = np.array([-1,  0, -1]) * next_digits[3]
-        v = (v1 + v2 + v3 + v4) / 4.0
-    else:
-        v1 = np.array([ 1,  1,  1]) * next_digits[0]
-        v2 = np.array([-1,  1,  1]) * next_digits[1]
-        v3 = np.array([ 1,  1, -1]) * next_digits[2]
-        v4 = np.array([-1,  1, -1]) * next_digits[3]
-        v5 = np.array([ 1, -1,  1]) * next_digits[4]
-        v6 = np.array([-1, -1,  1]) * next_digits[5]
-        v7 = np.array([ 1, -1, -1]) * next_digits[6]
-        v8 = np.array([-1, -1, -1]) * next_digits[7]
-        v = (v1 + v2 + v3 + v4 + v5 + v6 + v7 + v8) / 8.0
-    return v * cell['count']
-
-@njit
+# direcciones de cada digito siguiente, por dimension
+_next_digit_dirs = {
+    1: np.array([[ 1,  0,  0], [-1,  0,  0]], dtype=np.float64),
+    2: np.array([[ 1,  0,  1], [-1,  0,  1], [ 1,  0, -1], [-1,  0, -1]], dtype=np.float64),
+    3: np.array([
+        [ 1,  1,  1], [-1,  1,  1], [ 1,  1, -1], [-1,  1, -1],
+        [ 1, -1,  1], [-1, -1,  1], [ 1, -1, -1], [-1, -1, -1]
+    ], dtype=np.float64),
+}
+
+def _get_next_number_dirs(dim, next_digits, counts):
+    """Mean next number direction of every cell, weighted by its count."""
+    dirs = next_digits @ _next_digit_dirs[dim] / float(2**dim)
+    return dirs * counts[:, np.newaxis]
+
+@njit(cache=True)
 def _num_intersect_rationals(rationals, cell_rationals):
     """
     Count the number of rationals that intersect with the cell's rationals.
@@ -61,17 +52,16 @@ def _num_intersect_rationals(rationals, cell_rationals):
             continue
     return count
 
-def get_objects(view_cells, number, dim, accumulate, rationals, config, ccolor, 
+def get_objects(view_cells, number, dim, accumulate, config, ccolor, 
                 view_objects, view_time, view_next_number, max_time, ptime, max_spaces_time):
     """
     Get objects for the spacetime visualization.
 
     Parameters:
-    - view_cells: The list of cells to visualize.
+    - view_cells: The dict of cell arrays to visualize, as returned by space_to_arrays.
     - number: The number of objects to create.
     - dim: The dimension of the spacetime.
     - accumulate: Whether to accumulate the objects.
-    - rationals: The list of rational numbers to check.
     - config: The configuration object.
     - ccolor: The color configuration object.
     - view_objects: Whether to view objects.
@@ -90,10 +80,14 @@ def get_objects(view_cells, number, dim, accumulate, rationals, config, ccolor,
     if number == 0:
         return objs, 0, cell_ids
 
-    count = len(view_cells)
+    count = len(view_cells['count'])
     if count == 0:
         return objs, 0, cell_ids
 
+    positions = view_cells['pos']
+    counts = view_cells['count']
+    times = view_cells['time']
+
     normalize_alpha = config.get('normalize_alpha')
     alpha_pow = config.get('alpha_pow')
 
@@ -108,38 +102,32 @@ def get_objects(view_cells, number, dim, accumulate, rationals, config, ccolor,
     max_faces = config.get('max_faces')
     faces_pow = config.get('faces_pow')
 
-    total = 0
-    max = -1
-    count = 0
-    cells_counts = []
-    for cell in view_cells:
-        cell_count = cell['count']
-        total += cell_count
-        if cell_count > 0:
-            if len(rationals) > 0 and len(cell['rationals']) > 0:
-                set_rationals = set(rationals)
-                set_cell_rationals = set(cell['rationals'])
-                cell_count = len(set_rationals.intersection(set_cell_rationals))
-                del set_rationals
-                del set_cell_rationals
-            if cell_count > max:
-                max = cell_count
-            count += 1
-        cells_counts.append(cell_count)
+    # con seleccion, el conteo de cada celda es el numero de racionales seleccionados que contiene
+    cells_counts = counts if view_cells['selected'] is None else np.where(counts > 0, view_cells['selected'], 0)
+    stats = view_cells.get('stats')
+    if stats is not None:
+        # caminos, celdas y conteo maximo calculados al computar el espacio
+        total = int(stats[0])
+    else:
+        total = int(counts.sum())
+    if stats is not None and view_cells['selected'] is None:
+        max = int(stats[2])
+        count = int(stats[1])
+    else:
+        max = int(cells_counts.max())
+        count = int(np.count_nonzero(cells_counts))
 
     num_id = 0
 
     if view_objects:
-        index = 0
-        for cell in view_cells:
-            cell_count = cells_counts[index]
-            index += 1
+        for index in range(len(counts)):
+            cell_count = int(cells_counts[index])
             if cell_count == 0:
                 continue
             alpha, rad = get_alpha(cell_count, total, max, normalize_alpha, alpha_pow, rad_factor, rad_pow, rad_min)
             color = ccolor.getColor(alpha)
 
-            pos = cell['pos']
+            pos = positions[index]
             if dim == 3:
                 obj = icosphere(vec3(pos[0], pos[1], pos[2]), rad, resolution=('div', int(max_faces * math.pow(rad, faces_pow))))
             elif dim == 2:
@@ -152,23 +140,23 @@ def get_objects(view_cells, number, dim, accumulate, rationals, config, ccolor,
                 obj = brick(vec3(pos[0] - c, 0, 0), vec3(pos[0] + c, 1, height))
             obj.option(color=color)
             objs[num_id] = obj
-            cell_count = cell['count']
+            cell_count = int(counts[index])
             if cell_count not in cell_ids:
                 cell_ids[cell_count] = []
             cell_ids[cell_count].append(num_id)
             num_id += 1
 
     elif view_time:
-        for cell in view_cells:
+        for index in range(len(counts)):
             if max_time == 0.0:
                 continue
-            alpha = float(cell['time']) / float(max_spaces_time)
+            alpha = float(times[index]) / float(max_spaces_time)
             rad = math.pow(alpha / rad_factor, rad_pow)
             if rad == 0:
                 continue
             color = ccolor.getColor(alpha)
 
-            pos = cell['pos']
+            pos = positions[index]
             if dim == 3:
                 f = 4 * rad
                 obj = icosahedron(vec3(pos[0], pos[1], pos[2]), f)
@@ -179,7 +167,7 @@ def get_objects(view_cells, number, dim, accumulate, rationals, config, ccolor,
                 obj = brick(vec3(pos[0] - c, 0, 0), vec3(pos[0] + c, 1, height))
             obj.option(color=color)
             objs[num_id] = obj
-            num = cell['count']
+            num = int(counts[index])
             if num not in cell_ids:
                 cell_ids[num] = []
             cell_ids[num].append(num_id)
@@ -188,17 +176,14 @@ def get_objects(view_cells, number, dim, accumulate, rationals, config, ccolor,
     if view_next_number: 
         length_factor = config.get('next_pos_length')
         rad_factor = config.get('next_pos_rad')
-        min_dir = 1000000
-        max_dir = -1000000
-        for cell in view_cells:
-            dir = _get_next_number_dir(dim, cell)
-            ndir = np.linalg.norm(dir)
-            if ndir < min_dir: min_dir = ndir
-            if ndir > max_dir: max_dir = ndir
-
-        for cell in view_cells:
-            dir = _get_next_number_dir(dim, cell)
-            mod_dir = np.linalg.norm(dir)
+        dirs = _get_next_number_dirs(dim, view_cells['next_digits'], counts)
+        mod_dirs = np.linalg.norm(dirs, axis=1)
+        min_dir = mod_dirs.min()
+        max_dir = mod_dirs.max()
+
+        for index in range(len(counts)):
+            dir = dirs[index]
+            mod_dir = mod_dirs[index]
             if min_dir < max_dir:
                 k = np.power((mod_dir*1.5 - min_dir) / (max_dir*15 - min_dir), 0.75)
                 if k <= 1.0e-6:
@@ -210,7 +195,7 @@ def get_objects(view_cells, number, dim, accumulate, rationals, config, ccolor,
             dir = dir * k / mod_dir
             mod_dir = k
 
-            pos = cell['pos']
+            pos = positions[index]
             base = vec3(pos[0], pos[1], pos[2])
             dir_len = 5.0 * length_factor
             if dim == 1:
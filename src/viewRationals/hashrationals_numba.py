@@ -6,6 +6,12 @@ import numpy as np
 
 hash_size = 1000000  # Tamaño por defecto para HashRationalsItem
 
+# bytes aproximados de las estructuras de numba, para las cuentas de memoria
+hash_bytes = 96         # HashRationals y su lista
+item_bytes = 64         # HashRationalsItem
+dict_bytes = 256        # Dict vacio
+dict_entry_bytes = 40   # entrada de un Dict(int32, int8) con su hueco en la tabla
+
 # Especificación para HashRationalsItem
 hash_rationals_item_spec = [
     ('min', int32),
@@ -85,6 +91,20 @@ class HashRationals:
                 return True
         return False
 
+    def contains(self, m):
+        """Indica si el racional m esta en el conjunto."""
+        for item in self.hash_list:
+            if m in item.rationals:
+                return True
+        return False
+
+    def memory(self):
+        """Approximate bytes used by the set."""
+        nbytes = hash_bytes + 8 * len(self.hash_list)
+        for item in self.hash_list:
+            nbytes += item_bytes + dict_bytes + dict_entry_bytes * len(item.rationals)
+        return nbytes
+
     def get_rationals(self):
         rationals = List.empty_list(int32)  # Usar List tipada para compatibilidad con Numba
         for item in self.hash_list:
@@ -0,0 +1,274 @@
+import os
+from PIL import Image, ImageDraw
+import numpy as np
+
+from color import _convert_color
+from spacetime_numba import load_slice
+
+epsilon = 5.
+colors = [(100, 100, 100), (200, 100, 0), (150, 80, 0), (255, 255, 0)]
+
+
+class Scene:
+    """
+    Bars of a histogram, x is the count of the cells and height the number
+    of cells with that count. The bars are numpy arrays sorted by x, with
+    levels that join them in bins of 2, 4, 8... counts keeping the highest
+    bar, so rendering at any zoom draws about one bar per pixel at most and
+    never goes back to the cells.
+    """
+    def __init__(self, width: int, height: int, y_factor: float=1., background: tuple=(0, 0, 0)) -> None:
+        self.width: int = width
+        self.height: int = height
+        self.min_x = 0.
+        self.max_x = 0.
+        self.y_factor = y_factor
+        self.background = tuple(int(x * 255) for x in background)
+        self.ox: float = width / 2
+        self.scl: float = 1.
+        self.levels = []
+        self.select_area = None
+        self.clear()
+
+    def clear(self):
+        self.set_items(np.zeros(0), np.zeros(0), np.zeros((0, 3)))
+
+    def set_items(self, xs, heights, colors):
+        """Sets the bars, colors as rgb floats in [0, 1], and precomputes the bins of every zoom."""
+        order = np.argsort(xs, kind='stable')
+        xs = np.asarray(xs, dtype=np.float64)[order]
+        heights = np.asarray(heights, dtype=np.float64)[order]
+        colors = np.clip(np.asarray(colors, dtype=np.float64)[order] * 255, 0, 255).astype(np.uint8)
+        self.max_x = xs[-1] if len(xs) else 0.
+        self.levels = [(0., xs, heights, colors)]
+        width = 1.
+        while len(xs) > 1:
+            width *= 2.
+            bins = np.floor(self.levels[0][1] / width)
+            order = np.lexsort((-self.levels[0][2], bins))
+            # la barra mas alta de cada bin lo representa
+            first = np.ones(len(order), dtype=bool)
+            first[1:] = bins[order][1:] != bins[order][:-1]
+            keep = order[first]
+            if len(keep) == len(xs):
+                continue
+            xs, heights, colors = (array[keep] for array in self.levels[0][1:])
+            self.levels.append((width, xs, heights, colors))
+        self.level_widths = np.array([level[0] for level in self.levels])
+
+    @property
+    def items(self):
+        return self.levels[0][1]
+
+    def scale(self, screen_x: float, mouse_step: float):
+        screen_ox = self.ox * self.scl
+        factor = 1.05 if mouse_step > 0. else 1./1.05
+        self.scl *= factor
+        self.ox = ((screen_ox - screen_x) * factor + screen_x) / self.scl
+
+    def fit(self):
+        xs = self.items
+        if len(xs):
+            self.fit_range(xs[0], xs[-1])
+
+    def fit_range(self, min_x: float, max_x: float):
+        self.min_x = min_x
+        self.max_x = max_x
+        if self.max_x != self.min_x:
+            self.scl = self.width / (self.max_x - self.min_x)
+            self.ox = -self.min_x
+        else:
+            self.scl = self.width / self.max_x
+            self.ox = 0.
+        self.scale(self.width / 2.0, -1.0)
+
+    def translate(self, dist: float):
+        self.ox += dist / self.scl
+
+    def screen2world(self, xscr: int) -> float:
+        return xscr / self.scl - self.ox
+    
+    def world2screen(self, xwrld: float) -> int:
+        return int((xwrld + self.ox) * self.scl)
+
+    @staticmethod
+    def _loga(a, x):
+        return np.log(x) / np.log(a)
+    
+    def _loga_round(self, a, x):
+        return int(np.power(a, int(self._loga(a, x))))
+
+    def _get_y_step_max(self, y_base):
+        y_step = int(self._loga_round(y_base, 1.0))
+        y_step = y_step if y_step > 0 else 1
+        y_max = y_step * np.power(y_base, 2)
+        return int(y_step), int(y_max)
+    
+    def _get_x_step_max(self, x_base):
+        x_step = self._loga_round(x_base, x_base * 10 / self.scl)
+        x_step = x_step if x_step > 0 else 1
+        x_max = x_step * int(np.power(x_base, 3))
+        return int(x_step), int(x_max)
+
+    def _render_grid(self, draw: ImageDraw):
+        x_base = 10
+        y_base = 5
+
+        y_step, y_max = self._get_y_step_max(y_base)
+        for y in range(y_step, y_max, y_step):
+            color = colors[0]
+            if y % ( 5 * y_step) == 0: color = colors[2]
+            if y % (10 * y_step) == 0: color = colors[1]
+            if self._loga(y_base, y) >= 1 and color == colors[0]:
+                continue
+            h = np.power(y / y_max, self.y_factor) * self.height
+            draw.line((0, self.height - h, self.width, self.height - h), color, 1)
+            if y % (5 * y_step) == 0:
+                draw.text((3, self.height - h), f'{y*4}', fill=color, size=12)
+
+        x_step, x_max = self._get_x_step_max(x_base)
+        for x in range(-x_max, x_max, x_step):
+
+            color = colors[0]
+            if x == 0: color = colors[3]
+            else:
+                if abs(x_max - x) % ( 5 * x_step) == 0: color = colors[2]
+                if abs(x_max - x) % (10 * x_step) == 0: color = colors[1]
+            px = int((x + self.ox) * self.scl)
+            if px < 0 or px > self.width: 
+                continue
+            w = 1 if np.abs(px) > 0.1 else 3
+            draw.line((px, self.height, px, 0), color, w)
+            if abs(x_max - x) % ( 5 * x_step) == 0:
+                draw.text((px+4, 4), f'{x:,d}', fill=color, size=12)
+
+    def _get_level(self):
+        # el nivel mas grueso con bins de un pixel como mucho
+        return int(np.searchsorted(self.level_widths, 1. / self.scl, side='right')) - 1
+
+    def render(self):
+        img = Image.new('RGB', (self.width, self.height), self.background)
+        draw = ImageDraw.Draw(img)
+
+        if self.select_area:
+            self.select_area.render(draw)
+
+        self._render_grid(draw)
+        _, y_max = self._get_y_step_max(10)
+        _, xs, heights, colors = self.levels[self._get_level()]
+        px = ((xs + self.ox) * self.scl).astype(np.int64)
+        visible = (px >= -1) & (px <= self.width)
+        if np.any(visible):
+            pixels = np.array(img)
+            tops = (self.height - np.power(heights[visible] / y_max, self.y_factor) * self.height).astype(np.int64)
+            tops = np.clip(tops, 0, self.height)
+            # cada barra son 3 pixeles de ancho, como las lineas de antes
+            for x, top, color in zip(px[visible], tops, colors[visible]):
+                pixels[top:, max(0, x - 1):x + 2] = color
+            img = Image.fromarray(pixels)
+            draw = ImageDraw.Draw(img)
+
+        draw.rectangle((0, 0, self.width-1, self.height-1), None, (255, 255, 255), 1)
+        return img
+    
+    def itemat(self, x):
+        """Count of the bar under the screen position x, None if there is none."""
+        xs = self.items
+        if not len(xs):
+            return None
+        x = self.screen2world(x)
+        eps = epsilon / self.scl
+        distances = np.abs(xs - x)
+        index = int(np.argmin(distances))
+        return int(xs[index]) if distances[index] <= eps else None
+
+    def init_select_area(self, begin: int):
+        self.select_area = SelectArea(begin, self)
+
+    def expand_select_area(self, end: int):
+        if self.select_area:
+            self.select_area.set_end(end)
+
+    def end_select_area(self):
+        """Counts of the bars inside the selected area."""
+        if not self.select_area:
+            return []
+        selected = [int(x) for x in self.items if self.select_area.inside(x)]
+        self.select_area = None
+        return selected
+
+
+class SelectArea:
+    def __init__(self, begin: int, scene: Scene):
+        self.begin = begin
+        self.end = begin
+        self.scene = scene
+
+    def set_end(self, end: int):
+        self.end = end
+
+    def render(self, draw: ImageDraw.Draw):
+        colors = [(50, 50, 50), (50, 50, 200)]
+        if self.begin == self.end:
+            return
+        if self.end < self.begin:
+            t = self.end
+            self.end = self.begin
+            self.begin = t
+        draw.rectangle((self.begin, 0, self.end, self.scene.height), colors[0], colors[1], 1)
+
+    def inside(self, xwrld: float):
+        x = self.scene.world2screen(xwrld)
+        if self.begin <= x <= self.end:
+            return True
+        return False
+
+
+def get_histogram_colors(counts, number, config, ccolor):
+    """Colors of the bars of the counts, as rgb floats, with the alpha of the cells of each count."""
+    normalize_alpha = config.get('normalize_alpha')
+    alpha_pow = config.get('alpha_pow')
+    div = float(counts.max()) if normalize_alpha else float(number)
+    alphas = np.power(counts / div, alpha_pow)
+    return ccolor.getColors(alphas)
+
+
+def _slice_histogram(arrays):
+    # histograma guardado con el espacio, o el de las celdas seleccionadas
+    if arrays['selected'] is None and arrays['histogram'] is not None:
+        return arrays['histogram'][:, 0], arrays['histogram'][:, 1]
+    counts = arrays['count'] if arrays['selected'] is None else arrays['count'][arrays['selected'] > 0]
+    return np.unique(counts[counts > 0], return_counts=True)
+
+
+def save_histogram_strips(folder: str, times, number: int, config, ccolor, width: int, height: int) -> int:
+    """
+    Renders the histogram of every time of a video in one pass, from the
+    slices saved by save_slices in folder, as {t}_histogram_strip.npy RGBA
+    arrays that the render processes paste in their frames. All the strips
+    share the x scale, fitted to the counts of all the times.
+    Returns the number of bytes saved.
+    """
+    histograms = {t: _slice_histogram(load_slice(folder, t)) for t in times}
+    scene = Scene(width, height, config.get('histogram_y_factor'), _convert_color(config.get('histogram_background')))
+    xs = [counts for counts, _ in histograms.values() if len(counts)]
+    if xs:
+        scene.fit_range(min(x[0] for x in xs), max(x[-1] for x in xs))
+    nbytes = 0
+    for t, (counts, frequencies) in histograms.items():
+        if len(counts):
+            scene.set_items(counts, frequencies, get_histogram_colors(counts, number, config, ccolor))
+        else:
+            scene.clear()
+        strip = np.asarray(scene.render().convert('RGBA'))
+        np.save(os.path.join(folder, f'{t}_histogram_strip.npy'), strip)
+        nbytes += strip.nbytes
+    return nbytes
+
+
+def load_histogram_strip(folder: str, t: int):
+    """RGBA image of the histogram of time t saved by save_histogram_strips, None if there is none."""
+    fname = os.path.join(folder, f'{t}_histogram_strip.npy')
+    if not os.path.exists(fname):
+        return None
+    return Image.fromarray(np.load(fname), 'RGBA')
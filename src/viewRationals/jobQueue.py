@@ -0,0 +1,284 @@
+import numbaCache
+import os
+import sys
+import json
+import socket
+import argparse
+import traceback
+from time import time
+from multiprocessing import freeze_support, Process, Manager, Pipe, parent_process
+from gc import collect
+
+from batchRender import load_job, get_tasks, init_render, compute, render_task
+from timing import timing, save_trace
+
+
+class JobQueue:
+    """
+    Work directory shared by the workers of one or several hosts.
+
+    Every task of a sweep is a json file that moves between the folders
+    pending, running, done and failed. A worker claims a task renaming it
+    from pending to running, which is atomic, so two workers never get the
+    same task. Running tasks are touched periodically from a separate process,
+    the ones not touched for a while belong to a dead worker and go back to
+    pending.
+    """
+    states = ('pending', 'running', 'done', 'failed')
+
+    def __init__(self, path: str, retries: int=2, timeout: float=600.0) -> None:
+        self.path = path
+        self.retries = retries
+        self.timeout = timeout
+        for state in self.states:
+            os.makedirs(os.path.join(path, state), exist_ok=True)
+
+    def _file(self, state, name):
+        return os.path.join(self.path, state, name)
+
+    def _write(self, state, name, record):
+        fname = self._file(state, name)
+        tmp_name = fname + '.tmp'
+        with open(tmp_name, 'wt') as fp:
+            json.dump(record, fp)
+        os.replace(tmp_name, fname)
+
+    def _read(self, state, name):
+        with open(self._file(state, name), 'rt') as fp:
+            return json.load(fp)
+
+    def _names(self, state):
+        return sorted(name for name in os.listdir(os.path.join(self.path, state)) if name.endswith('.json'))
+
+    def get_job(self):
+        with open(os.path.join(self.path, 'job.json'), 'rt') as fp:
+            return json.load(fp)
+
+    def submit(self, job) -> int:
+        """Saves the job and adds its tasks to pending, skipping the ones already queued or done."""
+        with open(os.path.join(self.path, 'job.json'), 'wt') as fp:
+            json.dump(job, fp, indent=4)
+        queued = set()
+        for state in self.states:
+            queued.update(self._names(state))
+        count = 0
+        # los numeros pequeños primero, los resultados llegan antes
+        tasks = sorted(get_tasks(job), key=lambda task: (task['number'], task['dim'], task['period']))
+        for task in tasks:
+            # el nombre solo depende de la tarea, al reenviar un job cambiado no se repiten
+            name = f'N{task["number"]:020d}_D{task["dim"]}_P{task["period"]:02d}.json'
+            if name in queued:
+                continue
+            task['attempts'] = 0
+            self._write('pending', name, task)
+            count += 1
+        return count
+
+    def claim(self, worker: str):
+        """Moves the first pending task to running and returns (name, task), None when there are no more."""
+        for name in self._names('pending'):
+            try:
+                os.rename(self._file('pending', name), self._file('running', name))
+            except OSError:
+                # otro worker lo ha cogido antes
+                continue
+            task = self._read('running', name)
+            task['worker'] = worker
+            task['started'] = time()
+            self._write('running', name, task)
+            return name, task
+        return None
+
+    def _remove(self, state, name) -> None:
+        try:
+            os.remove(self._file(state, name))
+        except OSError:
+            # la tarea se reencolo mientras se hacia, se ha terminado de todos modos
+            pass
+
+    def touch(self, name) -> None:
+        try:
+            os.utime(self._file('running', name))
+        except OSError:
+            pass
+
+    def owns(self, name, worker: str) -> bool:
+        """True if the running task name is still claimed by worker, it could have been requeued and claimed by another."""
+        try:
+            return self._read('running', name).get('worker') == worker
+        except (OSError, ValueError):
+            return False
+
+    def finish(self, name, task) -> None:
+        task['finished'] = time()
+        self._write('done', name, task)
+        if self.owns(name, task['worker']):
+            self._remove('running', name)
+        self._remove('pending', name)
+
+    def fail(self, name, task, error: str) -> None:
+        """Puts the task back in pending until it has failed retries times, then in failed."""
+        if not self.owns(name, task['worker']):
+            # se reencolo y otro worker la esta haciendo
+            return
+        task['attempts'] = task.get('attempts', 0) + 1
+        task['error'] = error
+        state = 'pending' if task['attempts'] <= self.retries else 'failed'
+        self._write(state, name, task)
+        self._remove('running', name)
+
+    def requeue_stale(self) -> int:
+        """
+        Returns to pending the running tasks of workers that stopped touching them,
+        counting it as a failed attempt, in failed after retries attempts.
+        """
+        count = 0
+        now = time()
+        for name in self._names('running'):
+            stale_name = name + '.stale'
+            try:
+                if now - os.path.getmtime(self._file('running', name)) < self.timeout:
+                    continue
+                # renombrarlo es atomico, solo un worker lo reencola
+                os.rename(self._file('running', name), self._file('running', stale_name))
+                task = self._read('running', stale_name)
+            except (OSError, ValueError):
+                continue
+            task['attempts'] = task.get('attempts', 0) + 1
+            task['error'] = f'worker lost: {task.get("worker", "?")}'
+            state = 'pending' if task['attempts'] <= self.retries else 'failed'
+            self._write(state, name, task)
+            self._remove('running', stale_name)
+            print(f'------- requeued stale task {name} to {state}')
+            count += 1
+        return count
+
+    def retry_failed(self) -> int:
+        count = 0
+        for name in self._names('failed'):
+            task = self._read('failed', name)
+            task['attempts'] = 0
+            self._write('pending', name, task)
+            self._remove('failed', name)
+            count += 1
+        return count
+
+    def status(self) -> dict:
+        return {state: len(self._names(state)) for state in self.states}
+
+
+def _heartbeat(queue: JobQueue, conn) -> None:
+    """
+    Touches the running task of its worker. It runs in its own process because
+    the numba kernels of the compute never release the GIL, a thread would not
+    run until the compute ends. conn receives the task name, None when it ends
+    and False to stop.
+    """
+    name = None
+    parent = parent_process()
+    while parent is None or parent.is_alive():
+        if conn.poll(queue.timeout / 4):
+            name = conn.recv()
+            if name is False:
+                break
+        if name is not None:
+            queue.touch(name)
+
+
+def _worker(path, retries, timeout, index):
+    """Worker process: claims and renders tasks until the queue has no pending ones."""
+    queue = JobQueue(path, retries, timeout)
+    job = queue.get_job()
+    init_render(job)
+    worker = f'{socket.gethostname()}:{os.getpid()}'
+    manager = Manager()
+    conn, heartbeat_conn = Pipe()
+    heartbeat = Process(target=_heartbeat, args=(queue, heartbeat_conn), daemon=True)
+    heartbeat.start()
+    spacetime = None
+    while True:
+        queue.requeue_stale()
+        claimed = queue.claim(worker)
+        if claimed is None:
+            break
+        name, task = claimed
+        print(f'------- worker {index} [{worker}] task {name}')
+        conn.send(name)
+        time1 = time()
+        try:
+            spacetime = compute(task, spacetime)
+            if not render_task(job, task, spacetime, manager):
+                raise ValueError('render failed')
+        except Exception as e:
+            print(f'------- ERROR worker {index} task {name}: {str(e)}')
+            queue.fail(name, task, traceback.format_exc())
+            continue
+        finally:
+            conn.send(None)
+            collect()
+        task['duration'] = time() - time1
+        queue.finish(name, task)
+        print(f'------- worker {index} task {name} done in {task["duration"]:,.2f} secs')
+    conn.send(False)
+    heartbeat.join()
+    manager.shutdown()
+    save_trace()
+
+
+@timing
+def work(path, num_workers=1, retries=2, timeout=600.0):
+    """Runs num_workers worker processes on this host until the queue is empty."""
+    workers = [Process(target=_worker, args=(path, retries, timeout, index)) for index in range(num_workers)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+
+def print_status(queue: JobQueue) -> None:
+    status = queue.status()
+    total = sum(status.values())
+    print(', '.join(f'{state}: {count}' for state, count in status.items()) + f', total: {total}')
+    now = time()
+    for name in queue._names('running'):
+        try:
+            task = queue._read('running', name)
+        except (OSError, ValueError):
+            continue
+        print(f'    running {name} on {task.get("worker", "?")} for {now - task.get("started", now):,.0f} secs')
+    for name in queue._names('failed'):
+        task = queue._read('failed', name)
+        error = task.get('error', '').strip().splitlines()
+        print(f'    failed {name}: {error[-1] if error else ""}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Queue of render tasks shared by several workers and hosts.')
+    parser.add_argument('queue', help='work directory of the queue, shared by all the hosts')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    submit_parser = subparsers.add_parser('submit', help='split a job in tasks and add them to the queue')
+    submit_parser.add_argument('job', help='json file with the job spec, see batchRender.default_job')
+    work_parser = subparsers.add_parser('work', help='render pending tasks until the queue is empty')
+    work_parser.add_argument('--workers', type=int, default=1, help='worker processes in this host')
+    subparsers.add_parser('status', help='print the progress of the queue')
+    subparsers.add_parser('retry', help='move the failed tasks back to pending')
+    parser.add_argument('--retries', type=int, default=2)
+    parser.add_argument('--timeout', type=float, default=600.0, help='secs before a silent running task is requeued')
+    args = parser.parse_args(argv)
+
+    queue = JobQueue(args.queue, args.retries, args.timeout)
+    if args.command == 'submit':
+        print(f'------- {queue.submit(load_job(args.job))} tasks added')
+    elif args.command == 'work':
+        work(args.queue, args.workers, args.retries, args.timeout)
+        print_status(queue)
+    elif args.command == 'retry':
+        print(f'------- {queue.retry_failed()} tasks requeued')
+    else:
+        print_status(queue)
+    return 0
+
+
+if __name__ == '__main__':
+    freeze_support()
+    sys.exit(main())
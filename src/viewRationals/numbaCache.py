@@ -0,0 +1,20 @@
+import os
+import sys
+
+
+def init_cache():
+    """
+    Points the numba on-disk cache to a writable folder when the sources
+    folder is not writable, as in the PyInstaller build. It must run before
+    numba is imported, numba reads NUMBA_CACHE_DIR only once.
+    """
+    if os.environ.get('NUMBA_CACHE_DIR'):
+        return
+    folder = os.path.dirname(os.path.abspath(__file__))
+    if not getattr(sys, 'frozen', False) and os.access(folder, os.W_OK):
+        return
+    base = os.environ.get('LOCALAPPDATA') or os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    os.environ['NUMBA_CACHE_DIR'] = os.path.join(base, 'viewRationals', 'numba')
+
+
+init_cache()
@@ -0,0 +1,87 @@
+from collections import OrderedDict
+from threading import Thread, Lock
+from queue import Queue
+
+
+class ObjectsCache:
+    """
+    Small LRU cache of object sets built by get_objects.
+
+    Keys are tuples describing everything the objects depend on
+    (time, accumulate, view flags, selection...). Values are whatever
+    the builder returns, usually (objs, count_cells, cell_ids).
+    """
+    def __init__(self, size: int=12) -> None:
+        self.size = size
+        self.items = OrderedDict()
+        self.lock = Lock()
+
+    def __contains__(self, key) -> bool:
+        with self.lock:
+            return key in self.items
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.items:
+                return None
+            self.items.move_to_end(key)
+            return self.items[key]
+
+    def put(self, key, value) -> None:
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.size:
+                self.items.popitem(last=False)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.items.clear()
+
+
+class ObjectsPrefetcher(Thread):
+    """
+    Background thread that fills an ObjectsCache with the object sets
+    of the frames the user is likely to visit next.
+
+    build(*args) is called from this thread, so args must hold every
+    parameter needed to build the objects (no Qt widget access).
+    """
+    def __init__(self, cache: ObjectsCache, build) -> None:
+        super().__init__(daemon=True)
+        self.cache = cache
+        self.build = build
+        self.requests = Queue()
+        self.busy = Lock()
+        self.generation = 0
+
+    def prefetch(self, key, args) -> None:
+        if key in self.cache:
+            return
+        self.requests.put((self.generation, key, args))
+
+    def cancel(self) -> None:
+        """Drop pending requests and wait for the one being built, if any."""
+        with self.busy:
+            self.generation += 1
+        while not self.requests.empty():
+            self.requests.get_nowait()
+
+    def stop(self) -> None:
+        self.cancel()
+        self.requests.put((None, None, None))
+
+    def run(self) -> None:
+        while True:
+            generation, key, args = self.requests.get()
+            if generation is None:
+                break
+            with self.busy:
+                if generation != self.generation or key in self.cache:
+                    continue
+                try:
+                    value = self.build(*args)
+                except Exception as e:
+                    print(f'------- ERROR prefetching objects {key}: {str(e)}')
+                    continue
+                self.cache.put(key, value)
@@ -1,4 +1,4 @@
-from numba import njit, int32, float64, int64, uint8, types
+from numba import njit, int32, float64, int64, uint8, uint64, types
 from numba.experimental import jitclass
 import numpy as np
 
@@ -6,18 +6,20 @@ from utils_numba import *
 
 c = 0.5
 
-@njit
+# bytes aproximados de un Rational sin sus arrays
+rational_bytes = 256
+
+@njit(cache=True)
 def _digits2rational(digits_uint8, base):
     """Convert uint8 array of digit characters to rational m/n."""
     m = 0
     l = len(digits_uint8)
     for i in range(l):
-        d = int64(digits_uint8[l - i - 1])
-        m += d * base**i
+        m = m * base + int64(digits_uint8[i])
     n = base**l - 1
     return m, n
 
-@njit
+@njit(cache=True)
 def _get_sequence_digits(m, n, dim):
     """Get sequence of digits as uint8 array."""
     base = int(2**dim)
@@ -40,7 +42,7 @@ def _get_sequence_digits(m, n, dim):
 
     return digits[:count]  # Trim array to actual size
 
-@njit
+@njit(cache=True)
 def _get_sequence_reminders(m, n, dim):
     """Get sequence of reminders as int32 array."""
     base = int(2**dim)
@@ -61,7 +63,7 @@ def _get_sequence_reminders(m, n, dim):
     
     return reminders[:count]  # Trim array to actual size
 
-@njit
+@njit(cache=True)
 def _get_period(m, n, dim):
     """Calculate the period of the rational sequence."""
     if n == 1:
@@ -78,29 +80,46 @@ def _get_period(m, n, dim):
             break
     return p
 
-@njit
-def _get_positions(period, digits, dim, positions):
-    """Calculate positions for the rational sequence."""
-    x = 0.0
-    y = 0.0
-    z = 0.0
-    for i in range(period + 1):
-        positions[i, 0] = x
-        positions[i, 1] = y
-        positions[i, 2] = z
-        if i < period + 1:
-            idx = i % period
-            digit = int(digits[idx])  # Convert uint8 to int
-            dx = (digit % 2)
-            x += c - dx
-            if dim > 1:
-                dy = (digit // 2) % 2
-                y += c - dy
-            if dim > 2:
-                dz = (digit // 4) % 2
-                z += c - dz
-
-@njit
+@njit(cache=True)
+def _popcount(x):
+    """Number of 1-bits of a uint64."""
+    x = x - ((x >> np.uint64(1)) & np.uint64(0x5555555555555555))
+    x = (x & np.uint64(0x3333333333333333)) + ((x >> np.uint64(2)) & np.uint64(0x3333333333333333))
+    x = (x + (x >> np.uint64(4))) & np.uint64(0x0f0f0f0f0f0f0f0f)
+    return int64((x * np.uint64(0x0101010101010101)) >> np.uint64(56))
+
+@njit(cache=True)
+def _low_bits(n):
+    """uint64 with the n lower bits set, n <= 64."""
+    if n >= 64:
+        return np.uint64(0xffffffffffffffff)
+    return (np.uint64(1) << np.uint64(n)) - np.uint64(1)
+
+@njit(cache=True)
+def _bit_planes(digits, dim):
+    """
+    One uint64 per axis, bit i is the bit of the axis in digit i; the 4th
+    has bit i set when digit i differs from the next one, cyclically.
+    The periods are at most 50 digits, they fit in 64 bits.
+    """
+    planes = np.zeros(4, dtype=np.uint64)
+    l = len(digits)
+    for i in range(l):
+        digit = np.uint64(digits[i])
+        bit = np.uint64(1) << np.uint64(i)
+        for axis in range(dim):
+            if (digit >> np.uint64(axis)) & np.uint64(1):
+                planes[axis] |= bit
+        if digits[i] != digits[(i + 1) % l]:
+            planes[3] |= bit
+    return planes
+
+@njit(cache=True)
+def _count_bits(plane, t, period):
+    """1-bits in the first t bits of plane repeated every period bits."""
+    return (t // period) * _popcount(plane) + _popcount(plane & _low_bits(t % period))
+
+@njit(cache=True)
 def _path_uint8(digits, length=0):
     """Return path as uint8 array instead of string."""
     if length == 0:
@@ -112,7 +131,7 @@ def _path_uint8(digits, length=0):
         result[i] = digits[i % l]
     return result
 
-@njit
+@njit(cache=True)
 def _path_string(digits, length=0):
     """Return path as string (for compatibility)."""
     if length == 0:
@@ -127,49 +146,45 @@ def _path_string(digits, length=0):
         result += str(digit_val)
     return result
 
-@njit
+@njit(cache=True)
 def _reminders_list(reminders):
     """Return reminders list."""
     return reminders
 
-@njit
+@njit(cache=True)
 def _reminder(reminders, t, period):
     """Get reminder at time t."""
     return reminders[t % period]
 
-@njit
+@njit(cache=True)
 def _digit(digits, t, period):
     """Get digit at time t."""
     return digits[t % period]
 
-@njit
-def _time(digits, t):
-    """Calculate time based on digit changes."""
-    T = len(digits)
-    time = 0
-    for i in range(t):
-        if digits[i % T] != digits[(i + 1) % T]:
-            time += 1
-    return time
-
-@njit
-def _position(positions, t, period):
-    """Get position at time t."""
-    px, py, pz = 0.0, 0.0, 0.0
-    nt = t // period
-    if nt > 0:
-        for _ in range(nt):
-            px += positions[period, 0]
-            py += positions[period, 1]
-            pz += positions[period, 2]
-    rt = t % period
-    if rt != 0:
-        px += positions[rt, 0]
-        py += positions[rt, 1]
-        pz += positions[rt, 2]
+@njit(cache=True)
+def _time(planes, t, period):
+    """Calculate time, the number of digit changes in the first t digits."""
+    return _count_bits(planes[3], t, period)
+
+@njit(cache=True)
+def _lattice(planes, t, period):
+    """Number of 1-bits per axis of the first t digits, the exact position in the lattice."""
+    return (
+        _count_bits(planes[0], t, period),
+        _count_bits(planes[1], t, period),
+        _count_bits(planes[2], t, period),
+    )
+
+@njit(cache=True)
+def _position(planes, t, period, dim):
+    """Get position at time t, c*t minus the 1-bits of each axis."""
+    ox, oy, oz = _lattice(planes, t, period)
+    px = c * t - ox
+    py = (c * t - oy) if dim > 1 else 0.0
+    pz = (c * t - oz) if dim > 2 else 0.0
     return px, py, pz
 
-@njit
+@njit(cache=True)
 def _eq(reminders1, reminders2):
     """Check if two reminder sequences are equal."""
     l = len(reminders1)
@@ -183,7 +198,7 @@ def _eq(reminders1, reminders2):
             return True
     return False
 
-@njit
+@njit(cache=True)
 def _neq(reminders1, reminders2):
     """Check if two reminder sequences are not equal."""
     return not _eq(reminders1, reminders2)
@@ -201,7 +216,7 @@ spec = [
     ('period', int32),
     ('digits', uint8[:]),           # Changed from int32 to uint8
     ('reminders', int32[:]),
-    ('positions', float64[:, :])
+    ('planes', uint64[:]),          # bits de cada eje y cambios de digito
 ]
 
 @jitclass(spec)
@@ -215,13 +230,16 @@ class Rational:
         self.period = 0
         self.digits = np.zeros(1, dtype=np.uint8)     # Changed to uint8
         self.reminders = np.zeros(1, dtype=np.int32)
-        self.positions = np.zeros((1, 3), dtype=np.float64)
+        self.planes = np.zeros(4, dtype=np.uint64)
         if self.n != 0:
             self.period = _get_period(self.m, self.n, self.dim)
             self.digits = _get_sequence_digits(self.m, self.n, self.dim)
             self.reminders = _get_sequence_reminders(self.m, self.n, self.dim)
-            self.positions = np.zeros((self.period+1, 3), dtype=np.float64)
-            _get_positions(self.period, self.digits, self.dim, self.positions)
+            self.planes = _bit_planes(self.digits, self.dim)
+
+    def memory(self):
+        """Approximate bytes used by the rational and its arrays."""
+        return rational_bytes + self.digits.nbytes + self.reminders.nbytes + self.planes.nbytes
 
     def set(self, m, n, dim=1):
         """Set new rational parameters."""
@@ -235,11 +253,15 @@ class Rational:
 
     def position(self, t):
         """Get position at time t."""
-        return _position(self.positions, t, self.period)
+        return _position(self.planes, t, self.period, self.dim)
+
+    def lattice(self, t):
+        """Get the 1-bits per axis at time t, position(t) is c*t minus them."""
+        return _lattice(self.planes, t, self.period)
 
     def time(self, t):
         """Get time based on digit changes."""
-        return _time(self.digits, t)
+        return _time(self.planes, t, self.period)
 
     def path(self, length=0):
         """Get path as string."""
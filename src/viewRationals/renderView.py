@@ -1,14 +1,80 @@
 import gc
+import os
+from collections import OrderedDict
 import numpy as np
 import moderngl as mgl
 from copy import deepcopy
 from madcad import rendering, uvec2, fmat4
 from gc import collect
 
+# contextos y framebuffers de cada proceso, las vistas que renderizan
+# a resoluciones que se repiten reutilizan los buffers de GPU y de numpy
+_contexts = {}
+_framebuffers = OrderedDict()
+max_framebuffers = 8
+
+
+def get_context(share=True):
+    """Standalone GL context of this process, created once. Keyed by pid so forked processes create their own."""
+    key = (os.getpid(), share)
+    if key not in _contexts:
+        _contexts[key] = mgl.create_standalone_context(share=share)
+    return _contexts[key]
+
+
+def get_framebuffers(ctx, size, picking=True):
+    """
+    Returns (fb_screen, fb_ident, map_ident, map_depth) of the given size
+    from the pool of ctx, allocating them the first time. Without picking
+    only fb_screen is allocated and the rest are None. The caller uses
+    them until it calls release_framebuffers with the same arguments.
+    """
+    w, h = size
+    key = (ctx, (w, h), picking)
+    if key in _framebuffers:
+        _framebuffers.move_to_end(key)
+        entry = _framebuffers[key]
+        entry[1] += 1
+        return entry[0]
+    if picking:
+        buffers = (
+            ctx.simple_framebuffer((w, h)),
+            ctx.simple_framebuffer((w, h), components=3, dtype='f1'),
+            np.empty((h,w), dtype='u2'),
+            np.empty((h,w), dtype='f4'),
+        )
+    else:
+        buffers = (ctx.simple_framebuffer((w, h)), None, None, None)
+    _framebuffers[key] = [buffers, 1]
+    _trim_framebuffers()
+    return buffers
+
+
+def release_framebuffers(ctx, size, picking=True):
+    """The caller no longer uses the buffers of get_framebuffers, they stay in the pool to be reused."""
+    w, h = size
+    entry = _framebuffers.get((ctx, (w, h), picking))
+    if entry is not None:
+        entry[1] = max(0, entry[1] - 1)
+    _trim_framebuffers()
+
+
+def _trim_framebuffers():
+    # solo se liberan los buffers que no usa ninguna vista, los mas antiguos primero,
+    # si todos estan en uso el pool crece por encima de max_framebuffers
+    unused = [key for key, entry in _framebuffers.items() if entry[1] == 0]
+    for key in unused[:max(0, len(_framebuffers) - max_framebuffers)]:
+        buffers, _ = _framebuffers.pop(key)
+        for fb in buffers[:2]:
+            if fb is not None:
+                fb.release()
+
 
 class RenderView(rendering.Offscreen):
-    def __init__(self, scene, size=uvec2(1920, 1080), navigation=None, projection=None, share=True, ctx=None):
+    def __init__(self, scene, size=uvec2(1920, 1080), navigation=None, projection=None, share=True, ctx=None, picking=True):
         self.scene: rendering.Scene = scene
+        self.picking = picking
+        self.fb_key = None
         self.projection = projection
         self.navigation = navigation
 
@@ -24,7 +90,7 @@ class RenderView(rendering.Offscreen):
         self.fresh = set()	# set of refreshed internal variables since the last render
 
         if not ctx:
-            self.scene.ctx = mgl.create_standalone_context(share=share)
+            self.scene.ctx = get_context(share)
         else:
             self.scene.ctx = ctx
 
@@ -32,6 +98,9 @@ class RenderView(rendering.Offscreen):
         self.preload()
 
     def __del__(self):
+        if self.fb_key is not None:
+            release_framebuffers(*self.fb_key)
+            self.fb_key = None
         del self.scene
         del self.uniforms
         del self.targets
@@ -49,12 +118,15 @@ class RenderView(rendering.Offscreen):
         assert ctx, 'context is not initialized'
 
         # self.fb_frame is already created and sized by Qt
-        self.fb_screen = ctx.simple_framebuffer(size)
-        self.fb_ident = ctx.simple_framebuffer(size, components=3, dtype='f1')
-        self.targets = [ ('screen', self.fb_screen, self.setup_screen),
-                            ('ident', self.fb_ident, self.setup_ident)]
-        self.map_ident = np.empty((h,w), dtype='u2')
-        self.map_depth = np.empty((h,w), dtype='f4')
+        # se piden los nuevos antes de devolver los anteriores, si el tamaño no cambia se reutilizan
+        fb_key = (ctx, (w, h), self.picking)
+        self.fb_screen, self.fb_ident, self.map_ident, self.map_depth = get_framebuffers(*fb_key)
+        if self.fb_key is not None:
+            release_framebuffers(*self.fb_key)
+        self.fb_key = fb_key
+        self.targets = [('screen', self.fb_screen, self.setup_screen)]
+        if self.picking:
+            self.targets.append(('ident', self.fb_ident, self.setup_ident))
 
     def set_projection(self, projection):
         self.projection = deepcopy(projection)
@@ -63,5 +135,60 @@ class RenderView(rendering.Offscreen):
         self.navigation = deepcopy(navigation)
 
     def resize(self, size):
-        if size != self.fb_screen.size:
-            self.init(size)
+        # siempre desde el pool: es una busqueda en un dict, y los buffers
+        # del tamaño anterior se devuelven para que otras vistas los reutilicen
+        self.init(size)
+
+    def _render_tile(self, size, x0, y0, x1, y1):
+        """
+        Renders the part [x0, x1] x [y0, y1] of the normalized device
+        coordinates of an image of the given size into the current framebuffer.
+        Same uniforms as ViewCommon.render with the projection scaled to the tile.
+        """
+        w, h = size
+        tile = fmat4(
+            2 / (x1 - x0), 0, 0, 0,
+            0, 2 / (y1 - y0), 0, 0,
+            0, 0, 1, 0,
+            -(x1 + x0) / (x1 - x0), -(y1 + y0) / (y1 - y0), 0, 1
+        )
+        self.uniforms['view'] = view = self.navigation.matrix()
+        self.uniforms['proj'] = proj = tile * self.projection.matrix(w / h, self.navigation.distance)
+        self.uniforms['projview'] = proj * view
+        self.fresh.clear()
+        self.scene.render(self)
+
+    def render_tiles(self, size, tile_size):
+        """
+        Renders an image of any size with a framebuffer of tile_size x tile_size,
+        yielding bands of rows, top-down, as uint8 arrays (rows, width, 4).
+        Only one band is kept in memory, the ident pass is not rendered.
+        """
+        w, h = size
+        tw, th = min(tile_size, w), min(tile_size, h)
+        self.resize((tw, th))
+        targets = self.targets
+        self.targets = [('screen', self.fb_screen, self.setup_screen)]
+        tile = np.empty((th, tw, 4), dtype=np.uint8)
+        try:
+            for by in range(0, h, th):
+                bh = min(th, h - by)
+                band = np.empty((bh, w, 4), dtype=np.uint8)
+                for bx in range(0, w, tw):
+                    bw = min(tw, w - bx)
+                    # los tiles del borde se recortan, la escala de todos es la misma
+                    self._render_tile(
+                        size,
+                        -1 + 2 * bx / w, 1 - 2 * (by + th) / h,
+                        -1 + 2 * (bx + tw) / w, 1 - 2 * by / h
+                    )
+                    self.fb_screen.read_into(tile, components=4)
+                    band[:, bx:bx + bw] = tile[::-1][:bh, :bw]
+                yield band
+        finally:
+            self.targets = targets
+
+    def render_into(self, buffer):
+        """Renders the scene and reads the RGBA pixels into buffer, bottom row first."""
+        rendering.ViewCommon.render(self)
+        self.fb_screen.read_into(buffer, components=4)
@@ -1,9 +1,11 @@
 import os
 import re
+import json
 import shutil
 import math
-from multiprocessing import Pool, cpu_count
-from threading import Lock
+from multiprocessing import Pool, Semaphore, cpu_count
+from multiprocessing.util import Finalize
+from multiprocessing.shared_memory import SharedMemory
 from PIL import Image, ImageDraw, ImageFont
 import numpy as np
 from madcad import vec3, settings
@@ -12,12 +14,23 @@ from gc import collect
 
 from views import ViewRender
 from getObjects import get_objects
-from utils import make_video
-from timing import timing
+from spacetime_numba import load_slice
+from histogramScene import save_histogram_strips, load_histogram_strip
+from utils import make_video, open_video_pipe
+from timing import timing, span, count, enable_trace, save_trace
 from color import _convert_color
+from objectsCache import ObjectsCache
 
 settings_file = 'settings.txt'
-mutex = Lock()
+manifest_file = 'export.json'
+png_end = b'\x00\x00\x00\x00IEND\xaeB`\x82'
+
+# objetos de los ultimos tiempos creados en este proceso, los frames de
+# un mismo ptime solo cambian la camara y comparten la geometria
+_objects_cache = ObjectsCache(2)
+
+# estado de cada proceso de render, creado por _init_worker
+_worker = {}
 
 
 def _del_folder(folder):
@@ -33,7 +46,7 @@ def _del_folder(folder):
     os.rmdir(folder)
 
 
-def _makePath(accumulate, factors, image_path, dim_str, period, number, single_image=False, subfolder=''):
+def _getPath(accumulate, factors, image_path, dim_str, period, number, single_image=False, subfolder=''):
     if accumulate:
         if not single_image:
             path = os.path.join(image_path, f'P{period:02d}', dim_str, 'Accumulate', f'N{number:d}_F{factors}', subfolder)
@@ -44,14 +57,77 @@ def _makePath(accumulate, factors, image_path, dim_str, period, number, single_i
             path  = os.path.join(image_path, f'P{period:02d}', dim_str, f'N{number:d}_F{factors}', subfolder)
         else:
             path = os.path.join(image_path, 'Snapshots', dim_str, 'Not Accumulate', subfolder)
+    return path
+
+
+def _makePath(accumulate, factors, image_path, dim_str, period, number, single_image=False, subfolder='', keep=False):
+    path = _getPath(accumulate, factors, image_path, dim_str, period, number, single_image, subfolder)
     if os.path.exists(path):
-        if not single_image:
+        if not single_image and not keep:
             _del_folder(path)
     if not os.path.exists(path):
         os.makedirs(path)
     return path
 
 
+def _load_manifest(path, job):
+    """
+    Returns the manifest of a previous export in path if it was made with the
+    same job parameters, None otherwise.
+    """
+    fname = os.path.join(path, manifest_file)
+    if not os.path.exists(fname):
+        return None
+    try:
+        with open(fname, 'rt') as fp:
+            manifest = json.load(fp)
+    except (OSError, ValueError) as e:
+        print(f'ERROR reading manifest {fname}: {str(e)}')
+        return None
+    if manifest.get('params') != json.loads(json.dumps(job)):
+        return None
+    return manifest
+
+
+def _camera_state(obj):
+    """Returns the attributes of a projection or navigation as json values, to compare exports."""
+    state = {'type': type(obj).__name__}
+    for name in sorted(getattr(obj, '__dict__', {})):
+        state[name] = _json_value(getattr(obj, name))
+    return state
+
+
+def _json_value(value):
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    try:
+        return [_json_value(v) for v in value]
+    except TypeError:
+        pass
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return repr(value)
+
+
+def _is_complete_png(fname):
+    """True if fname is a png file that was written to the end (ends with the IEND chunk)."""
+    try:
+        with open(fname, 'rb') as fp:
+            fp.seek(-len(png_end), os.SEEK_END)
+            return fp.read() == png_end
+    except OSError:
+        return False
+
+
+def _save_manifest(path, manifest):
+    fname = os.path.join(path, manifest_file)
+    tmp_name = fname + '.tmp'
+    with open(tmp_name, 'wt') as fp:
+        json.dump(manifest, fp)
+    os.replace(tmp_name, fname)
+
+
 def _get_last_frame(filename):
     """
     Dado un nombre de fichero con frame, busca todos los ficheros en el mismo directorio
@@ -79,6 +155,27 @@ def _get_last_frame(filename):
     return max_frame
 
 
+def _get_frame_range(init_frame, end_frame, num_frames, frame_rate, max_time, accumulate, turn_angle):
+    """
+    Completes the frame range of an export as the save video dialog does:
+    num_frames 0 means one frame per time times the frame rate, end_frame 0
+    means up to max_time, and accumulate videos without turn show the 6 first times.
+    """
+    single_image = num_frames == 1
+    if num_frames == 0:
+        if end_frame == 0:
+            num_frames = int(max_time * frame_rate)
+        else:
+            num_frames = int((end_frame - init_frame + 1) * frame_rate)
+    if end_frame == 0:
+        end_frame = int(max_time)
+    if accumulate and turn_angle == 0 and num_frames > 1:
+        init_frame = 0
+        end_frame = 6
+        num_frames = 6
+    return init_frame, end_frame, num_frames, single_image
+
+
 def _get_number_img(number, period, ptime, config):
     background = (*[int(x) for x in config.get('background_color')], 255)
     img = Image.new('RGBA', (500, 40), background)
@@ -92,90 +189,186 @@ def _get_number_img(number, period, ptime, config):
     return img
 
 
-def _create_image(args):
-    view_type, shr_projection, shr_navigation, frame, factor, init_time, prefix, suffix, \
-    config, ccolor, spacetime, rationals, dim, number, period, factors, accumulate, dim_str, \
-    view_objects, view_time, view_next_number, max_time, \
-    image_resx, image_resy, path, rotate, dx, center, center_time, shr_num_video_frames, legend, single_imgae = args
+def _init_worker(export, slot_sems=None):
+    """
+    Pool initializer: loads the settings and creates the offscreen view and
+    its GL context once per process, all the frames of the export reuse them.
+    When streaming, it also attaches the shared memory frame ring.
+    """
+    settings.load(settings_file)
+    settings.display['background_color'] = vec3(*_convert_color(export['config'].get('background_color')))
+    enable_trace(export['config'].get('trace_path'))
+    # la traza del proceso se guarda cuando el pool lo termina
+    Finalize(None, save_trace, exitpriority=10)
+    _worker['export'] = export
+    _worker['view'] = ViewRender(export['view_type'])
+    if export['ring_name']:
+        _worker['ring'] = SharedMemory(name=export['ring_name'])
+        _worker['slot_sems'] = slot_sems
+
+
+def _get_overlays(ptime):
+    """Images pasted over the frame of ptime, as (RGBA image, left, top): legend and histogram."""
+    export = _worker['export']
+    overlays = []
+    if export['legend']:
+        overlays.append((_get_number_img(export['number'], export['period'], ptime, export['config']), 10, export['image_resy'] - 40))
+    if export['histogram']:
+        strip = load_histogram_strip(export['slices_path'], ptime)
+        if strip is not None:
+            overlays.append((strip, max(0, export['image_resx'] - strip.width - 10), 10))
+    return overlays
+
+
+def _write_ring_slot(frame, view, objs, ptime):
+    """
+    Renders frame straight into its slot of the shared memory ring and returns
+    the slot index. The slot is frame % num_slots, its semaphore is released by
+    the encoder once the frame has been sent to ffmpeg, so workers wait here
+    when the encoder falls behind. Rows are stored bottom-up as read from GL.
+    """
+    export = _worker['export']
+    resx = export['image_resx']
+    resy = export['image_resy']
+    frame_size = resx * resy * 4
+    slot = frame % export['ring_slots']
+
+    _worker['slot_sems'][slot].acquire()
+    buffer = _worker['ring'].buf[slot * frame_size:(slot + 1) * frame_size]
+    with span('render_into', frame=frame):
+        view.render_into(resx, resy, objs, buffer)
+
+    overlays = _get_overlays(ptime)
+    if overlays:
+        # las filas del anillo van de abajo arriba
+        pixels = np.ndarray((resy, resx, 4), dtype=np.uint8, buffer=buffer)
+        for overlay, left, top in overlays:
+            overlay = np.asarray(overlay)
+            height = min(overlay.shape[0], resy - top)
+            width = min(overlay.shape[1], resx - left)
+            pixels[resy - top - height:resy - top, left:left + width] = overlay[:height, :width][::-1]
+        del pixels
+    del buffer
+    return slot
+
+
+def _create_image(frame_desc):
+    frame, ptime, dx, position = frame_desc
+    export = _worker['export']
+    view: ViewRender = _worker['view']
+
+    config = export['config']
+    number = export['number']
+    period = export['period']
+    accumulate = export['accumulate']
+    image_resx = export['image_resx']
+    image_resy = export['image_resy']
 
     print(f'------- create image')
 
-    settings.load(settings_file)
-    settings.display['background_color'] = vec3(*_convert_color(config.get('background_color')))
-
-    view = ViewRender(view_type)
-    view.set_projection(shr_projection.value)
-    view.set_navigation(shr_navigation.value)
-    if rotate:
+    view.set_projection(export['projection'])
+    view.set_navigation(export['navigation'])
+    if export['rotate']:
         view.rotateTo3DVideo(dx)
 
-    ptime = init_time + frame // factor
+    if position is not None:
+        view.moveTo(position[0], position[1], position[2])
 
-    if center:
-        p = ptime * np.array(center) / center_time
-        view.moveTo(p[0], p[1], p[2])
+    key = (ptime, accumulate, number, export['view_objects'], export['view_time'], export['view_next_number'])
 
-    view_cells = spacetime[ptime]
-
-    mutex.acquire()
     try:
-        objs, _, _ = get_objects(view_cells, number, dim, accumulate, rationals, config, ccolor, 
-                                 view_objects, view_time, view_next_number, max_time, ptime, 1)
+        objs = _objects_cache.get(key)
+        if objs is None:
+            with span('get_objects', time=ptime):
+                view_cells = load_slice(export['slices_path'], ptime)
+                objs, count_cells, _ = get_objects(view_cells, number, export['dim'], accumulate, config, export['ccolor'], 
+                                                   export['view_objects'], export['view_time'], export['view_next_number'], 
+                                                   export['max_time'], ptime, 1)
+            count('cells', count_cells)
+            _objects_cache.put(key, objs)
     except Exception as e:
         print(f'ERROR creating objs: {str(e)}')
         print(traceback.print_exc())
         raise e
     
-    mutex.release()
     if not objs:
         print('------ NOT OBJS')
-        return
+        return frame, None
+
+    if export['ring_name']:
+        return frame, _write_ring_slot(frame, view, objs, ptime)
+
+    tile_size = config.get('tile_size')
+    if tile_size and max(image_resx, image_resy) > tile_size and export['view_type'] in ['1D', '2D', '3D']:
+        return _create_tiled_image(frame, view, objs, ptime), None
 
-    mutex.acquire()
     try:
-        img = view.render(image_resx, image_resy, objs)
+        with span('render', frame=frame):
+            img = view.render(image_resx, image_resy, objs)
     except Exception as e:
         print(f'ERROR rendering image: {str(e)}')
         print(traceback.print_exc())
         raise e
 
-    mutex.release()
     if not img:
         print('------- NOT IMG')
-        return
+        return frame, None
     
-    accum_str = ''
-    if accumulate:
-        accum_str = 'Accum_'
+    for overlay, left, top in _get_overlays(ptime):
+        img.alpha_composite(overlay, (left, top))
 
-    if legend:
-        number_img = _get_number_img(number, period, ptime, config)
-        img.alpha_composite(number_img, (10, image_resy - 40))
-        del number_img
-
-    file_name = f'{accum_str}{prefix}{dim_str}_N{int(number)}_P{int(period):02d}_F{factors}{suffix}.{frame:04d}.png'
-    if single_imgae:
+    path = export['path']
+    file_name = _get_file_name(export, frame)
+    if export['single_image']:
         frame = _get_last_frame(os.path.join(path, file_name))
         frame += 1
-        file_name = f'{accum_str}{prefix}{dim_str}_N{int(number)}_P{int(period):02d}_F{factors}{suffix}.{frame:04d}.png'
+        file_name = _get_file_name(export, frame)
 
     print(f'------- save: {file_name}, time: {ptime}')
-    shr_num_video_frames.value += 1
 
     fname = os.path.join(path, file_name)
     try:
-        img.save(fname)
+        with span('save_png', frame=frame):
+            img.save(fname)
     except Exception as e:
         print(f'ERROR saving image {fname}: {str(e)}')
         raise e
+    count('frames')
 
-    del args
-    del objs
-    del view
-    del img
-    collect()
+    return frame, None
+
+
+def _create_tiled_image(frame, view, objs, ptime):
+    """Renders an image larger than the tile size by tiles, streaming the rows to the png file."""
+    export = _worker['export']
+    path = export['path']
+    file_name = _get_file_name(export, frame)
+    if export['single_image']:
+        frame = _get_last_frame(os.path.join(path, file_name)) + 1
+        file_name = _get_file_name(export, frame)
+    overlays = _get_overlays(ptime)
+
+    print(f'------- save tiled: {file_name}, time: {ptime}')
+
+    fname = os.path.join(path, file_name)
+    try:
+        view.render_tiled(export['image_resx'], export['image_resy'], objs, fname, export['config'].get('tile_size'), overlays)
+    except Exception as e:
+        print(f'ERROR rendering tiled image {fname}: {str(e)}')
+        print(traceback.print_exc())
+        raise e
+    return frame
+
+
+def _get_video_name(path, prefix, suffix, number, period, factors, accumulate, dim_str, video_format):
+    accum_str = 'Accum_' if accumulate else ''
+    return os.path.join(path, f'{accum_str}{prefix}{dim_str}_N{number:d}_P{period:02d}_F{factors}{suffix}.{video_format}')
 
-    return
+
+def _get_file_name(export, frame):
+    accum_str = 'Accum_' if export['accumulate'] else ''
+    return f'{accum_str}{export["prefix"]}{export["dim_str"]}_N{int(export["number"])}_P{int(export["period"]):02d}' \
+           f'_F{export["factors"]}{export["suffix"]}.{frame:04d}.png'
 
 
 def _create_video(args):
@@ -184,7 +377,7 @@ def _create_video(args):
     path, image_resx, image_resy, frame_rate, \
     prefix, suffix, config, \
     number, period, factors, accumulate, dim_str,\
-    shr_num_video_frames, clean_images = args
+    shr_num_video_frames, clean_images, streamed = args
 
     shr_num_video_frames.value = -1
 
@@ -198,15 +391,19 @@ def _create_video(args):
     if accumulate:
         accum_str = 'Accum_'
 
-    in_sequence_name = os.path.join(path, f'{accum_str}{prefix}{dim_str}_N{number}_P{period:02d}_F{factors}{suffix}.%04d.png')
-    main_video_name = os.path.join(path, f'{accum_str}{prefix}{dim_str}_N{number:d}_P{period:02d}_F{factors}{suffix}.{video_format}')
-    result = make_video(
-        ffmpeg_path, 
-        in_sequence_name, main_video_name, 
-        video_codec, video_format, 
-        frame_rate, bit_rate, 
-        image_resx, image_resy
-    )
+    main_video_name = _get_video_name(path, prefix, suffix, number, period, factors, accumulate, dim_str, video_format)
+    if streamed:
+        # el video ya se ha codificado mientras se renderizaban los frames
+        result = os.path.exists(main_video_name)
+    else:
+        in_sequence_name = os.path.join(path, f'{accum_str}{prefix}{dim_str}_N{number}_P{period:02d}_F{factors}{suffix}.%04d.png')
+        result = make_video(
+            ffmpeg_path, 
+            in_sequence_name, main_video_name, 
+            video_codec, video_format, 
+            frame_rate, bit_rate, 
+            image_resx, image_resy
+        )
     if not result:
         print('------- ERROR: Error creating video')
         return
@@ -234,10 +431,10 @@ def _saveImages(args):
 
     shr_projection, shr_navigation, image_path, init_time, end_time, frame_rate, \
     subfolder, prefix, suffix, num_frames, turn_angle, config, \
-    ccolor, view_type, spacetime, rationals, dim, number, period, factors, \
+    ccolor, view_type, slices_path, dim, number, period, factors, \
     accumulate, dim_str, view_objects, view_time, view_next_number, \
     max_time, shr_num_video_frames, clean_images, center, center_time, num_cpus, \
-    legend, image_resx, image_resy = args
+    legend, image_resx, image_resy, stream, resume, cancel = args
     
     number = int(number)
     period = int(period)
@@ -249,10 +446,9 @@ def _saveImages(args):
         suffix = '_' + suffix
 
     single_image = True if num_frames == 1 else False
-    try:
-        path = _makePath(accumulate, factors, image_path, dim_str, period, number, single_image, subfolder)
-    except Exception as e:
-        print(f'ERROR: {str(e)}')
+    stream = stream and not single_image
+    # el video en stream se codifica siempre desde el frame 0, no se continua
+    resume = resume and not single_image and not stream
 
     if num_frames == 0:
         num_frames = end_time - init_time + 1
@@ -268,34 +464,181 @@ def _saveImages(args):
     else:
         range_frames = num_frames + 1
 
+    # parametros que definen el resultado, un export solo se continua si coinciden
+    job = {
+        'view_type': view_type,
+        'number': number,
+        'period': period,
+        'factors': factors,
+        'dim_str': dim_str,
+        'accumulate': accumulate,
+        'init_time': init_time,
+        'end_time': end_time,
+        'num_frames': num_frames,
+        'turn_angle': turn_angle,
+        'projection': _camera_state(shr_projection.value),
+        'navigation': _camera_state(shr_navigation.value),
+        'center': list(center) if center else None,
+        'center_time': center_time,
+        'view_objects': view_objects,
+        'view_time': view_time,
+        'view_next_number': view_next_number,
+        'max_time': max_time,
+        'legend': legend,
+        'histogram': bool(config.get('image_histogram')),
+        'image_resx': image_resx,
+        'image_resy': image_resy,
+        'prefix': prefix,
+        'suffix': suffix,
+    }
+
+    manifest = None
+    if resume:
+        manifest = _load_manifest(_getPath(accumulate, factors, image_path, dim_str, period, number, single_image, subfolder), job)
+    try:
+        path = _makePath(accumulate, factors, image_path, dim_str, period, number, single_image, subfolder, keep=manifest is not None)
+    except Exception as e:
+        print(f'ERROR: {str(e)}')
+    if manifest is None:
+        manifest = {'params': job, 'frames': []}
+    if not single_image and not stream:
+        _save_manifest(path, manifest)
+
+    # parametros comunes, se envian una sola vez a cada proceso de render
+    export = {
+        'view_type': view_type,
+        'projection': shr_projection.value,
+        'navigation': shr_navigation.value,
+        'config': config,
+        'ccolor': ccolor,
+        'slices_path': slices_path,
+        'dim': dim,
+        'number': number,
+        'period': period,
+        'factors': factors,
+        'accumulate': accumulate,
+        'dim_str': dim_str,
+        'view_objects': view_objects,
+        'view_time': view_time,
+        'view_next_number': view_next_number,
+        'max_time': max_time,
+        'image_resx': image_resx,
+        'image_resy': image_resy,
+        'path': path,
+        'prefix': prefix,
+        'suffix': suffix,
+        'rotate': turn_angle > 0,
+        'legend': legend,
+        'histogram': job['histogram'],
+        'single_image': single_image,
+        'stream': stream,
+        'ring_name': None,
+        'ring_slots': 0,
+    }
+
+    # descriptores de frame: (frame, ptime, yaw, centro)
     params = []
     for frame in range(range_frames):
-        rotate = False
-        dx = shr_navigation.value.yaw / math.pi
+        dx = export['navigation'].yaw / math.pi
         if turn_angle > 0:
             k = 0.005 * 400. / 360.
             dx += frame * k * float(turn_angle) / float(num_frames)
-            rotate = True
-        params.append((
-            view_type, shr_projection, shr_navigation, frame, factor, init_time, prefix, suffix,
-            config, ccolor, spacetime, rationals, dim, number, period, factors, accumulate, dim_str,
-            view_objects, view_time, view_next_number, max_time,
-            image_resx, image_resy, path, rotate, dx, center, center_time, shr_num_video_frames, legend,
-            single_image
-        ))
+        ptime = init_time + frame // factor
+        position = None
+        if center:
+            position = tuple(ptime * np.array(center) / center_time)
+        params.append((frame, ptime, dx, position))
+
+    # al continuar un export se saltan los frames ya guardados, se buscan en disco
+    # porque el manifiesto solo se guarda cada pocos frames
+    done = set()
+    if resume:
+        done = set(frame for frame in range(range_frames) if _is_complete_png(os.path.join(path, _get_file_name(export, frame))))
+    manifest['frames'] = sorted(done)
+    if done:
+        print(f'------- resuming export, {len(done)} frames already rendered')
+        params = [param for param in params if param[0] not in done]
+        shr_num_video_frames.value += len(done)
+
+    # el histograma de todos los tiempos se dibuja aqui una vez, los
+    # procesos de render solo lo pegan en sus frames
+    if export['histogram']:
+        with span('histogram_strips'):
+            count('bytes_histogram', save_histogram_strips(
+                slices_path, sorted(set(param[1] for param in params)), number, config, ccolor,
+                config.get('image_histogram_resx'), config.get('image_histogram_resy')
+            ))
 
     args_video = (
         path, image_resx, image_resy, frame_rate,
         prefix, suffix, config,
         number, period, factors, accumulate, dim_str,
-        shr_num_video_frames, clean_images
+        shr_num_video_frames, clean_images, export['stream']
     ) if not single_image else ()
 
-    chunksize = (range_frames // num_cpus) or 1
+    # trozos pequenos para que el progreso, la cancelacion y el manifiesto avancen
+    # frame a frame, los frames de un mismo tiempo van juntos si se puede
+    chunksize = max(1, min(factor, len(params) // (4 * num_cpus)))
+    video_pipe = None
+    ring = None
+    slot_sems = None
+    if export['stream']:
+        # los frames en curso deben caber en el anillo, trozos pequenos para que
+        # ningun proceso espere un hueco ocupado por un frame lejano
+        export['ring_slots'] = max(config.get('video_ring_slots'), 2 * num_cpus)
+        chunksize = max(1, min(factor, export['ring_slots'] // (2 * num_cpus)))
+        video_pipe = open_video_pipe(
+            config.get('ffmpeg_path'),
+            _get_video_name(path, prefix, suffix, number, period, factors, accumulate, dim_str, config.get('video_format')),
+            config.get('video_codec'), config.get('video_format'),
+            frame_rate, config.get('bit_rate'),
+            image_resx, image_resy, vflip=True
+        )
+        if video_pipe is None:
+            export['stream'] = False
+            args_video = args_video[:-1] + (False,)
+        else:
+            frame_size = image_resx * image_resy * 4
+            ring = SharedMemory(create=True, size=export['ring_slots'] * frame_size)
+            count('bytes_ring', ring.size)
+            export['ring_name'] = ring.name
+            slot_sems = [Semaphore(1) for _ in range(export['ring_slots'])]
     print(f'>>>>>>> range_frames: {range_frames}, num_cpus: {num_cpus}, chunksize: {chunksize}')
     
-    pool = Pool(num_cpus)
-    # pool.map_async(func=_create_image, iterable=params, chunksize=chunksize, error_callback=_error_callback)
-    pool.map(func=_create_image, iterable=params, chunksize=chunksize)
-
-    return (pool, args_video)
+    # cada proceso crea los objetos y renderiza sus frames sin bloqueos compartidos,
+    # el progreso se cuenta aqui segun van terminando
+    pool = Pool(num_cpus, initializer=_init_worker, initargs=(export, slot_sems))
+    pending = {}
+    next_frame = 0
+    try:
+        for frame, slot in pool.imap_unordered(_create_image, params, chunksize=chunksize):
+            shr_num_video_frames.value += 1
+            if cancel.is_set():
+                pool.terminate()
+                break
+            if ring is None:
+                if not single_image:
+                    manifest['frames'].append(frame)
+                    if len(manifest['frames']) % num_cpus == 0:
+                        _save_manifest(path, manifest)
+                continue
+            # los frames llegan desordenados, se envian a ffmpeg en orden
+            # y se libera su hueco en el anillo para el siguiente frame
+            pending[frame] = slot
+            while next_frame in pending:
+                slot = pending.pop(next_frame)
+                if slot is not None:
+                    video_pipe.stdin.write(ring.buf[slot * frame_size:(slot + 1) * frame_size])
+                    slot_sems[slot].release()
+                next_frame += 1
+    finally:
+        if ring is None and not single_image:
+            _save_manifest(path, manifest)
+        if video_pipe is not None:
+            video_pipe.stdin.close()
+            video_pipe.wait()
+        if ring is not None:
+            ring.close()
+            ring.unlink()
+
+    return (pool, args_video, slices_path)
@@ -2,7 +2,7 @@ from PyQt5 import QtWidgets
 from multiprocessing import cpu_count
 
 class SaveVideoWidget(QtWidgets.QDialog):
-    def __init__(self, parent, current_frame, max_time, views_mode, resx, resy, callback) -> None:
+    def __init__(self, parent, current_frame, max_time, views_mode, resx, resy, callback, stream=False) -> None:
         super().__init__(parent)
 
         print(f'Video Widget: ({resx}, {resy})')
@@ -102,6 +102,18 @@ class SaveVideoWidget(QtWidgets.QDialog):
         self.resy.setValue(resy)
         self.gridlayout.addWidget(self.resy, 12, 1)
 
+        self.label13 = QtWidgets.QLabel('Stream to ffmpeg')
+        self.gridlayout.addWidget(self.label13, 13, 0)
+        self.stream = QtWidgets.QCheckBox(self)
+        self.stream.setChecked(stream)
+        self.gridlayout.addWidget(self.stream, 13, 1)
+
+        self.label14 = QtWidgets.QLabel('Resume')
+        self.gridlayout.addWidget(self.label14, 14, 0)
+        self.resume = QtWidgets.QCheckBox(self)
+        self.resume.setChecked(False)
+        self.gridlayout.addWidget(self.resume, 14, 1)
+
         self.hlayout = QtWidgets.QHBoxLayout()
         self.hlayout.addStretch()
         self.button_save = QtWidgets.QPushButton('Save Video', self)
@@ -146,7 +158,9 @@ class SaveVideoWidget(QtWidgets.QDialog):
             self.noLegend.isChecked(),
             self.num_cpu.value(),
             self.resx.value(),
-            self.resy.value()
+            self.resy.value(),
+            self.stream.isChecked(),
+            self.resume.isChecked()
         )
 
 
@@ -12,7 +12,7 @@ from spacetime_numba import SpaceTime
 from cell_numba import Cell
 
 
-@njit
+@njit(cache=True)
 def getRationalsSeqs(rationals, number, dim):
     result = List()
     r = List.empty_list(int32)
@@ -34,7 +34,7 @@ def getRationalsSeqs(rationals, number, dim):
     return result
 
 
-@njit
+@njit(cache=True)
 def intersectRationals(rationals: list[int], cell_rationals: list[int]) -> list[int]:
     """
     Count the number of rationals that intersect with the cell's rationals.
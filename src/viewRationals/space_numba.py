@@ -1,12 +1,13 @@
-from numba import int32, float64
+from numba import int32, int64, float64
 from numba.experimental import jitclass
-from numba.typed import List
-from numba.types import ListType
+from numba.typed import List, Dict
+from numba.types import ListType, DictType
 import numpy as np
 from gc import collect
 
 from cell_numba import Cell
 from rationals_numba import c
+from hashrationals_numba import dict_bytes, dict_entry_bytes
 
 # Obtenemos el tipo de Cell FUERA del código compilado
 cell_type = Cell.class_type.instance_type
@@ -18,7 +19,8 @@ space_spec = [
     ('n', int32),
     ('dim', int32),
     ('base', int32),
-    ('indexes', int32[:]),  # Array NumPy en lugar de lista Python
+    ('size', int64),  # Numero de posiciones de la red, (t+1)^dim
+    ('indexes', DictType(int64, int32)),  # Posicion en la red -> indice de la celda, solo las ocupadas
     ('cells', ListType(cell_type)),  # Lista tipada de Cells
     ('num_cells', int32),  # Contador de celdas para optimización
 ]
@@ -32,9 +34,9 @@ class Space:
         self.dim = dim
         self.base = 2**dim
         
-        # Calcular el número de elementos necesarios
-        num = int((t + 1))**self.dim
-        self.indexes = np.full(num, -1, dtype=np.int32)  # Inicializar con -1
+        # el indice crece con las celdas ocupadas, no con la red
+        self.size = int(t + 1)**self.dim
+        self.indexes = Dict.empty(key_type=int64, value_type=int32)
         self.cells = List.empty_list(cell_type)
         self.num_cells = 0
 
@@ -42,18 +44,45 @@ class Space:
         nx = c * self.t - x
         ny = (c * self.t - y) if self.dim > 1 else 0.0
         nz = (c * self.t - z) if self.dim > 2 else 0.0
-        n = int(nx + (self.t + 1) * (ny + (self.t + 1) * nz))
+        n = int64(nx + (self.t + 1) * (ny + (self.t + 1) * nz))
         
-        if n < 0 or n >= len(self.indexes):
+        if n < 0 or n >= self.size:
             return None
             
-        if self.indexes[n] < 0:
+        if n not in self.indexes:
             self.indexes[n] = self.num_cells
             new_cell = Cell(self.dim, self.T, self.n, x, y, z)
             self.cells.append(new_cell)
             self.num_cells += 1
             
         return self.cells[self.indexes[n]]
+
+    def getCellAt(self, t, ox, oy, oz):
+        # celda de un punto del tiempo t con ox, oy, oz unos por eje; en enteros
+        # se usan medios pasos, 2*(c*self.t - x) = (self.t - t) + 2*ox, para que
+        # los espacios acumulados den la misma celda que getCell con floats
+        st = int64(self.t)
+        hx = (st - t) + 2 * ox
+        hy = ((st - t) + 2 * oy) if self.dim > 1 else 0
+        hz = ((st - t) + 2 * oz) if self.dim > 2 else 0
+        h = hx + (st + 1) * (hy + (st + 1) * hz)
+        # int() de getCell trunca hacia cero
+        n = h // 2 if h >= 0 else -((-h) // 2)
+
+        if n < 0 or n >= self.size:
+            return None
+
+        if n not in self.indexes:
+            self.indexes[n] = self.num_cells
+            # las posiciones en float solo se calculan para mostrarlas
+            x = c * t - ox
+            y = (c * t - oy) if self.dim > 1 else 0.0
+            z = (c * t - oz) if self.dim > 2 else 0.0
+            new_cell = Cell(self.dim, self.T, self.n, x, y, z)
+            self.cells.append(new_cell)
+            self.num_cells += 1
+
+        return self.cells[self.indexes[n]]
     
     def getRationals(self, x, y, z):
         cell = self.getCell(x, y, z)
@@ -73,15 +102,20 @@ class Space:
             num_paths += self.cells[i].get_count()
         return num_paths
 
-    def add(self, count, time, m, next_digit, x, y, z):
-        cell: Cell = self.getCell(x, y, z)
+    def add(self, count, time, m, next_digit, t, ox, oy, oz):
+        cell: Cell = self.getCellAt(t, ox, oy, oz)
         if cell is not None:
             cell.add(count, time, m, next_digit)
 
+    def add_group(self, count, time, ms, next_digits, t, ox, oy, oz):
+        cell: Cell = self.getCellAt(t, ox, oy, oz)
+        if cell is not None:
+            cell.add_group(count, time, ms, next_digits)
+
     def clear(self):
         # Crear nuevas estructuras en lugar de usar del
         self.cells = List.empty_list(cell_type)
-        self.indexes.fill(-1)  # Reiniciar todos los índices a -1
+        self.indexes = Dict.empty(key_type=int64, value_type=int32)
         self.num_cells = 0
 
     def getMaxTime(self):
@@ -92,6 +126,85 @@ class Space:
                 max_time = cell_time
         return max_time
     
+    def getStats(self):
+        """
+        Summary of the cells with paths: (paths, cells, max count, max time,
+        bounding box as min x, y, z, max x, y, z, histogram of the counts as
+        rows of (count, cells with that count) sorted by count).
+        """
+        paths = 0
+        max_count = 0
+        max_time = -1.0
+        box = np.zeros(6, dtype=np.float64)
+        counts = np.zeros(self.num_cells, dtype=np.int64)
+        cells = 0
+        for i in range(self.num_cells):
+            cell = self.cells[i]
+            if cell.count == 0:
+                continue
+            if cells == 0:
+                box[:] = (cell.x, cell.y, cell.z, cell.x, cell.y, cell.z)
+            else:
+                box[0] = min(box[0], cell.x)
+                box[1] = min(box[1], cell.y)
+                box[2] = min(box[2], cell.z)
+                box[3] = max(box[3], cell.x)
+                box[4] = max(box[4], cell.y)
+                box[5] = max(box[5], cell.z)
+            counts[cells] = cell.count
+            cells += 1
+            paths += cell.count
+            max_count = max(max_count, cell.count)
+            max_time = max(max_time, cell.time)
+
+        # histograma de conteos: conteos ordenados y agrupados
+        counts = np.sort(counts[:cells])
+        num = 0
+        for i in range(cells):
+            if i == 0 or counts[i] != counts[i - 1]:
+                num += 1
+        histogram = np.zeros((num, 2), dtype=np.int64)
+        j = -1
+        for i in range(cells):
+            if i == 0 or counts[i] != counts[i - 1]:
+                j += 1
+                histogram[j, 0] = counts[i]
+            histogram[j, 1] += 1
+        return paths, cells, max_count, max_time, box, histogram
+
+    def getArrays(self):
+        # Devuelve los datos numericos de las celdas sin crear objetos Python
+        pos = np.zeros((self.num_cells, 3), dtype=np.float64)
+        counts = np.zeros(self.num_cells, dtype=np.int32)
+        times = np.zeros(self.num_cells, dtype=np.float64)
+        next_digits = np.zeros((self.num_cells, self.base), dtype=np.int32)
+        for i in range(self.num_cells):
+            cell = self.cells[i]
+            pos[i, 0] = cell.x
+            pos[i, 1] = cell.y
+            pos[i, 2] = cell.z
+            counts[i] = cell.count
+            times[i] = cell.time
+            next_digits[i, :] = cell.next_digits
+        return pos, counts, times, next_digits
+
+    def countRationals(self, rationals_array):
+        # Numero de racionales seleccionados que contiene cada celda
+        counts = np.zeros(self.num_cells, dtype=np.int32)
+        for i in range(self.num_cells):
+            counts[i] = self.cells[i].count_rationals(rationals_array)
+        return counts
+
+    def memory(self):
+        """Approximate bytes used by the space: (index, cells, cell rationals)."""
+        cells = 8 * self.num_cells
+        rationals = 0
+        for i in range(self.num_cells):
+            own, hash = self.cells[i].memory()
+            cells += own
+            rationals += hash
+        return dict_bytes + dict_entry_bytes * len(self.indexes), cells, rationals
+
     def get_cell_at_index(self, index):
         # Método auxiliar para acceder a celdas por índice
         if 0 <= index < self.num_cells:
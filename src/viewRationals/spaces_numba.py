@@ -42,7 +42,7 @@ class Spaces:
         self.accumulates_even = Space(even_t, dim, T, n)
         self.accumulates_odd = Space(odd_t, dim, T, n)
 
-    def add(self, count, is_special, t, m, next_digit, time, cycle, x, y, z):
+    def add(self, count, is_special, t, m, next_digit, time, cycle, ox, oy, oz):
         """ Agrega un nuevo número racional a los espacios correspondientes.
         Args:
             count: Cantidad de números racionales.
@@ -52,38 +52,64 @@ class Spaces:
             next_digit: Índice del siguiente dígito.
             time: Tiempo asociado al número.
             cycle: Ciclo actual (para determinar acumulación).
-            x, y, z: Coordenadas del número en el espacio.
+            ox, oy, oz: Unos de cada eje, la posición es c*t menos ellos.
         """
         if t < 0 or t > self.max:
             return
         
-        self.spaces[t].add(count, time, m, next_digit, x, y, z)
+        self.spaces[t].add(count, time, m, next_digit, t, ox, oy, oz)
         
+        if not self.accumulates(is_special, t, cycle, ox, oy, oz):
+            return
+            
+        # Agregar a acumulados
+        if t % 2 == 0:
+            self.accumulates_even.add(count, time, m, next_digit, t, ox, oy, oz)
+        else:
+            self.accumulates_odd.add(count, time, m, next_digit, t, ox, oy, oz)
+
+    def add_group(self, count, is_special, t, ms, next_digits, time, cycle, ox, oy, oz):
+        """ Como add, para las rutas de varios racionales que estan en la misma celda
+        en el tiempo t. next_digits tiene las rutas por siguiente digito y time la suma
+        de los tiempos.
+        """
+        if t < 0 or t > self.max:
+            return
+
+        self.spaces[t].add_group(count, time, ms, next_digits, t, ox, oy, oz)
+
+        if not self.accumulates(is_special, t, cycle, ox, oy, oz):
+            return
+
+        if t % 2 == 0:
+            self.accumulates_even.add_group(count, time, ms, next_digits, t, ox, oy, oz)
+        else:
+            self.accumulates_odd.add_group(count, time, ms, next_digits, t, ox, oy, oz)
+
+    def accumulates(self, is_special, t, cycle, ox, oy, oz):
+        """ Indica si las rutas que estan en la celda ox, oy, oz en el tiempo t
+        se agregan a los espacios acumulados.
+        """
         # para los numeros especiales anadimos 
         # solo el ultimo ciclo en los espacios acumulados
         if t < self.max - cycle and is_special:
-            return
+            return False
             
         # No se acumulan en las celdas extremas los numeros especiales
         skip_accumulate = False
+        # x == t*c es sin unos, x == -t*c con t unos
         if self.dim == 1:
-            if (x == t * c or x == -t * c) and is_special:
+            if (ox == 0 or ox == t) and is_special:
                 skip_accumulate = True
         elif self.dim == 2:
-            if (x == y == t * c or x == y == z == -t * c) and is_special:
+            # z es 0 en 2D, el extremo negativo solo coincidia en t = 0
+            if ox == oy == 0 and is_special:
                 skip_accumulate = True
         else:  # dim == 3
-            if (x == y == z == t * c or x == y == z == -t * c) and is_special:
+            if (ox == oy == oz == 0 or ox == oy == oz == t) and is_special:
                 skip_accumulate = True
                 
-        if skip_accumulate:
-            return
-            
-        # Agregar a acumulados
-        if t % 2 == 0:
-            self.accumulates_even.add(count, time, m, next_digit, x, y, z)
-        else:
-            self.accumulates_odd.add(count, time, m, next_digit, x, y, z)
+        return not skip_accumulate
 
 
     def getMaxTime(self, accumulate):
@@ -125,6 +151,21 @@ class Spaces:
         self.accumulates_even = Space(even_t, dim, T, n)
         self.accumulates_odd = Space(odd_t, dim, T, n)
 
+    def memory(self):
+        """Approximate bytes used: (indexes, cells, cell rationals, accumulate spaces)."""
+        indexes = 0
+        cells = 0
+        rationals = 0
+        for i in range(len(self.spaces)):
+            space_indexes, space_cells, space_rationals = self.spaces[i].memory()
+            indexes += space_indexes
+            cells += space_cells
+            rationals += space_rationals
+        even = self.accumulates_even.memory()
+        odd = self.accumulates_odd.memory()
+        accumulates = even[0] + even[1] + even[2] + odd[0] + odd[1] + odd[2]
+        return indexes, cells, rationals, accumulates
+
     def getCell(self, t, x, y=0.0, z=0.0, accumulate=False):
         if not accumulate:
             return self.spaces[t].getCell(x, y, z)
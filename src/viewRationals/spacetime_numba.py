@@ -1,15 +1,17 @@
-from numba import int32, int64, boolean, njit, types
+from numba import int32, int64, float64, boolean, njit, types
 from numba.experimental import jitclass
 from numba.typed import List, Dict
 from numba.types import ListType
 import numpy as np
 from time import time
 from gc import collect
+import os
 
-from cell_numba import Cell
+from cell_numba import Cell, cell_bytes
 from spaces_numba import Spaces
 from space_numba import Space
-from rationals_numba import Rational, _digits2rational
+from rationals_numba import Rational, _digits2rational, rational_bytes
+from hashrationals_numba import hash_bytes, item_bytes, dict_bytes, dict_entry_bytes, hash_size
 from transform_numba import Transform
 from utils_numba import *
 
@@ -20,6 +22,7 @@ def create_rational(m, n, dim):
     return Rational(m, n, dim)
 
 rational_type = Rational.class_type.instance_type
+histogram_type = types.int64[:, :]
 
 # SpaceTime specification for jitclass
 spacetime_spec = [
@@ -32,6 +35,11 @@ spacetime_spec = [
     ('rationalSet', ListType(rational_type)),
     ('changed', boolean),
     ('transform', Transform.class_type.instance_type),
+    ('analytic', boolean),
+    ('stats', int64[:, :]),             # por espacio: caminos, celdas, conteo maximo
+    ('stats_time', float64[:]),         # por espacio: tiempo maximo de las celdas
+    ('stats_box', float64[:, :]),       # por espacio: min x, y, z, max x, y, z
+    ('histograms', ListType(histogram_type)),  # por espacio: (conteo, celdas)
 ]
 
 @jitclass(spacetime_spec)
@@ -59,6 +67,12 @@ class SpaceTime:
         self.rationalSet = List.empty_list(rational_type)
         self.changed = False
         self.transform = Transform()
+        self.analytic = True
+        self.stats = np.zeros((1, 3), dtype=np.int64)
+        self.stats_time = np.zeros(1, dtype=np.float64)
+        self.stats_box = np.zeros((1, 6), dtype=np.float64)
+        self.histograms = List.empty_list(histogram_type)
+        self.computeStats()
 
     def getParams(self):
         """Get the main parameters of the SpaceTime instance."""
@@ -73,6 +87,7 @@ class SpaceTime:
         self.n = 0
         self.is_special = False
         self.spaces.clear()
+        self.computeStats()
         # self.transform.set_active(False)
 
     def reset(self, T, n, max_val, dim):
@@ -85,6 +100,44 @@ class SpaceTime:
         self.rationalSet.clear()
         self.transform.set_active(False)
         self.changed = False
+        self.computeStats()
+
+    def computeStats(self):
+        """
+        Stores the summary of every space, the times 0 to max_val and then the
+        even and odd accumulates, so that readers do not walk the cells.
+        """
+        num = self.max_val + 3
+        self.stats = np.zeros((num, 3), dtype=np.int64)
+        self.stats_time = np.full(num, -1.0, dtype=np.float64)
+        self.stats_box = np.zeros((num, 6), dtype=np.float64)
+        self.histograms = List.empty_list(histogram_type)
+        for i in range(num):
+            if i <= self.max_val:
+                space = self.spaces.getSpace(i, False)
+            else:
+                space = self.spaces.getSpace(i - self.max_val - 1, True)
+            paths, cells, max_count, max_time, box, histogram = space.getStats()
+            self.stats[i, 0] = paths
+            self.stats[i, 1] = cells
+            self.stats[i, 2] = max_count
+            self.stats_time[i] = max_time
+            self.stats_box[i] = box
+            self.histograms.append(histogram)
+
+    def _statsIndex(self, t, accumulate):
+        if not accumulate:
+            return t
+        return self.max_val + 1 + t % 2
+
+    def getStats(self, t, accumulate=False):
+        """Paths, cells, max count, max time and bounding box of the space at time t."""
+        i = self._statsIndex(t, accumulate)
+        return self.stats[i, 0], self.stats[i, 1], self.stats[i, 2], self.stats_time[i], self.stats_box[i]
+
+    def getCountHistogram(self, t, accumulate=False):
+        """Rows of (count, number of cells with that count) of the space at time t."""
+        return self.histograms[self._statsIndex(t, accumulate)]
 
     def getCell(self, t, x, y=0, z=0, accumulate=False):
         """Get a specific cell from spaces."""
@@ -100,7 +153,9 @@ class SpaceTime:
     
     def getMaxTime(self, accumulate=False):
         """Get the maximum time from spaces."""
-        return self.spaces.getMaxTime(accumulate)
+        if not accumulate:
+            return self.stats_time[:self.max_val + 1].max()
+        return self.stats_time[self.max_val + 1:].max()
     
     def getSpace(self, t, accumulate=False):
         """Get the space at time t."""
@@ -108,7 +163,15 @@ class SpaceTime:
     
     def countPaths(self, t, accumulate=False):
         """Count paths at time t."""
-        return self.spaces.countPaths(t, accumulate)
+        return self.stats[self._statsIndex(t, accumulate), 0]
+
+    def getArrays(self, t, accumulate=False):
+        """Get positions, counts, times and next digits of the cells at time t."""
+        return self.spaces.getSpace(t, accumulate).getArrays()
+
+    def countRationals(self, rationals, t, accumulate=False):
+        """Count, per cell at time t, how many of the given rationals it holds."""
+        return self.spaces.getSpace(t, accumulate).countRationals(rationals)
     
     def setRationalSet(self, n, is_special=False):
         """Create a set of rational numbers with denominators from 0 to n."""
@@ -120,8 +183,12 @@ class SpaceTime:
             self.rationalSet.append(r)
 
     def addRationalSet(self, t, x, y, z):
-        """Add a set of rationals to the spaces."""
+        """Add a set of rationals to the spaces, x, y, z move the paths by whole cells."""
         T = int32(self.T)
+        # desplazamiento en unos por eje, x = c*t - ox
+        dx = int64(round(-x))
+        dy = int64(round(-y))
+        dz = int64(round(-z))
         hash = Dict.empty(key_type=int64, value_type=int64)
         base = 2 ** self.dim
         num_paths = 0
@@ -139,6 +206,21 @@ class SpaceTime:
 
         print(f"Rational set size: {len(self.rationalSet)}, Hash size: {len(hash)}, Number of paths: {num_paths}")
 
+        # en los tiempos multiplos de T la celda solo depende de los unos
+        # de cada eje en los T digitos; esos tiempos se llenan por grupos
+        # de racionales con los mismos unos, si los acumulados tienen la
+        # paridad de sus tiempos
+        whole = self.analytic and (T + self.max_val) % 2 == 0
+        size = len(hash)
+        group_keys = Dict.empty(key_type=int64, value_type=int64)
+        groups = np.zeros(size, dtype=np.int64)
+        members = np.zeros(size, dtype=np.int64)
+        group_ones = np.zeros((size, 3), dtype=np.int64)
+        group_counts = np.zeros(size, dtype=np.int64)
+        group_times = np.zeros(size, dtype=np.float64)
+        group_next = np.zeros((size, base), dtype=np.int32)
+
+        i = 0
         for m in hash:
             count = hash[m]
             if self.transform.active == False:
@@ -146,16 +228,66 @@ class SpaceTime:
             else:
                 rat = Rational(m, num, self.dim)
             digits = rat.path_uint8(T)
+            if whole:
+                ox, oy, oz = rat.lattice(T)
+                key = ox + (T + 1) * (oy + (T + 1) * oz)
+                if key not in group_keys:
+                    group_keys[key] = len(group_keys)
+                    group_ones[group_keys[key]] = (ox, oy, oz)
+                g = group_keys[key]
+                groups[i] = g
+                members[i] = m
+                group_counts[g] += count
+                group_times[g] += rat.time(T)
+                group_next[g, digits[1 % T]] += count
+                i += 1
             for rt in range(self.max_val + 1):
-                px, py, pz = rat.position(t+rt)
-                px += x
-                py += y
-                pz += z
+                if whole and (t+rt) % T == 0:
+                    continue
+                ox, oy, oz = rat.lattice(t+rt)
                 next_digit = digits[(t+rt+1) % T]
                 rtime = rat.time(t+rt)
-                self.spaces.add(count, self.is_special, t+rt, m, next_digit, rtime, T, px, py, pz)
+                self.spaces.add(count, self.is_special, t+rt, m, next_digit, rtime, T, ox + dx, oy + dy, oz + dz)
+
+        if whole:
+            self._addWholePeriods(t, dx, dy, dz, len(group_keys), groups, members, group_ones, group_counts, group_times, group_next)
 
+        self.computeStats()
         self.changed = True
+        return num_paths
+
+    def _addWholePeriods(self, t, dx, dy, dz, num_groups, groups, members, group_ones, group_counts, group_times, group_next):
+        """
+        Fills the times multiple of T from t to t + max_val: at k*T every path
+        of a group is in the cell of k times the group's 1-bits per axis, with
+        k times the group's time.
+        """
+        T = int32(self.T)
+        order = np.argsort(groups, kind='mergesort')
+        starts = np.zeros(num_groups + 1, dtype=np.int64)
+        for g in groups:
+            starts[g + 1] += 1
+        starts = np.cumsum(starts)
+        first = ((t + T - 1) // T) * T
+        for tt in range(first, t + self.max_val + 1, T):
+            k = tt // T
+            for g in range(num_groups):
+                ms = members[order[starts[g]:starts[g + 1]]]
+                self.spaces.add_group(
+                    group_counts[g], self.is_special, tt, ms, group_next[g], k * group_times[g], T,
+                    k * group_ones[g, 0] + dx, k * group_ones[g, 1] + dy, k * group_ones[g, 2] + dz
+                )
+
+    def memory(self):
+        """
+        Approximate bytes used, by component: (space indexes, cells,
+        cell rationals, rational set, accumulate spaces).
+        """
+        indexes, cells, rationals, accumulates = self.spaces.memory()
+        rational_set = 8 * len(self.rationalSet)
+        for r in self.rationalSet:
+            rational_set += r.memory()
+        return indexes, cells, rationals, rational_set, accumulates
 
     def get_rational_count(self):
         """Get the number of rationals in the current set."""
@@ -181,6 +313,69 @@ def create_spacetime(T, n, max_val, dim=1):
     """Factory function to create a SpaceTime instance."""
     return SpaceTime(T, n, max_val, dim)
 
+memory_components = ('indexes', 'cells', 'rationals', 'rational_set', 'accumulates')
+
+# Memory used by a SpaceTime instance by component
+def memory_report(spacetime: SpaceTime):
+    """Bytes used by each component of spacetime, and the total."""
+    report = dict(zip(memory_components, spacetime.memory()))
+    report['total'] = sum(report.values())
+    return report
+
+# Memory a SpaceTime will need, before computing it
+def estimate_memory(dim: int, T: int, number: int, max_val: int, is_special: bool=False, num: int=0):
+    """
+    Upper estimate of the bytes, by component as memory_report, that computing
+    number with period T up to max_val will use. num is the n of the spacetime,
+    2^(dim*T) - 1 by default. Every rational visits one cell per time, so the
+    cells of a slice are at most min((t+1)^dim, number+1).
+    """
+    num = num or 2**(dim * T) - 1
+    rationals = number + 1
+    base = 2**dim
+    # cada celda crea num // hash_size + 1 diccionarios, aunque esten vacios
+    items = num // hash_size + 1
+    cell = 8 + cell_bytes + 4 * base
+    cell_hash = hash_bytes + items * (8 + item_bytes + dict_bytes)
+
+    num_cells = sum(min((t + 1)**dim, rationals) for t in range(max_val + 1))
+    indexes = (max_val + 1) * dict_bytes + num_cells * dict_entry_bytes
+    acc_lattice = (max_val + 1)**dim
+    acc_entries = rationals * (T if is_special else max_val + 1)
+    acc_cells = 2 * min(acc_lattice, acc_entries)
+    return_value = {
+        'indexes': indexes,
+        'cells': num_cells * cell,
+        'rationals': num_cells * cell_hash + rationals * (max_val + 1) * dict_entry_bytes,
+        'rational_set': rationals * (8 + rational_bytes + 5 * T + 32),
+        'accumulates': 2 * dict_bytes + acc_cells * (cell + cell_hash + dict_entry_bytes) + acc_entries * dict_entry_bytes,
+    }
+    return_value['total'] = sum(return_value.values())
+    return return_value
+
+# Largest max time, a multiple of T, whose estimate fits in limit bytes
+def fit_max_time(dim: int, T: int, number: int, max_val: int, limit: int, is_special: bool=False):
+    """Returns the largest max time <= max_val, in steps of T, that fits in limit, 0 if none does."""
+    max_time = max_val
+    while max_time > 0:
+        if estimate_memory(dim, T, number, max_time, is_special)['total'] <= limit:
+            return max_time
+        max_time = (max_time - 1) // T * T
+    return 0
+
+# Memory available for a new compute
+def available_memory():
+    """Bytes of physical memory available, None if unknown."""
+    try:
+        import psutil
+        return psutil.virtual_memory().available
+    except ImportError:
+        pass
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (ValueError, OSError, AttributeError):
+        return None
+
 # Convert the entire SpaceTime instance to a list of lists of dicts
 def spacetime_to_dicts(spacetime: SpaceTime, accumulate):
     """Convert a SpaceTime instance to a list of dicts."""
@@ -212,6 +407,111 @@ def space_to_dicts(spacetime: SpaceTime, t: int, accumulate: bool):
         })
     return cells
 
+# Convert a single Space instance to a dict of numpy arrays
+def space_to_arrays(spacetime: SpaceTime, t: int, accumulate: bool, rationals=None):
+    """
+    Convert a Space instance to a dict of numpy arrays.
+
+    The rationals of each cell are not extracted, only the number of
+    selected rationals per cell when a non empty selection is given.
+    stats holds the paths, cells and max count of the space and histogram
+    its count histogram, both computed by addRationalSet.
+    """
+    pos, counts, times, next_digits = spacetime.getArrays(t, accumulate)
+    selected = None
+    if rationals is not None and len(rationals) > 0:
+        rationals_array = np.fromiter(rationals, dtype=np.int32, count=len(rationals))
+        selected = spacetime.countRationals(rationals_array, t, accumulate)
+    return {
+        'pos': pos,
+        'count': counts,
+        'time': times,
+        'next_digits': next_digits,
+        'selected': selected,
+        'stats': np.array(spacetime.getStats(t, accumulate)[:3], dtype=np.int64),
+        'histogram': spacetime.getCountHistogram(t, accumulate),
+    }
+
+# Convert the entire SpaceTime instance to a list of dicts of numpy arrays
+def spacetime_to_arrays(spacetime: SpaceTime, accumulate: bool, rationals=None):
+    """Convert a SpaceTime instance to a list of dicts of numpy arrays, one per time."""
+    return [space_to_arrays(spacetime, t, accumulate, rationals) for t in range(spacetime.max_val + 1)]
+
+slice_arrays = ('pos', 'count', 'time', 'next_digits', 'selected', 'stats', 'histogram')
+
+# Save the cell arrays of some time slices as .npy files in folder
+def save_slices(spacetime: SpaceTime, accumulate: bool, rationals, folder: str, times):
+    """
+    Save the cell arrays of the given times in folder, one .npy file per array,
+    so that other processes can memory map only the slices they need.
+    Returns the number of bytes saved.
+    """
+    nbytes = 0
+    for t in times:
+        arrays = space_to_arrays(spacetime, t, accumulate, rationals)
+        for name in slice_arrays:
+            if arrays[name] is not None:
+                np.save(os.path.join(folder, f'{t}_{name}.npy'), arrays[name])
+                nbytes += arrays[name].nbytes
+    return nbytes
+
+# Load a time slice saved by save_slices, memory mapped and read only
+def load_slice(folder: str, t: int):
+    """Load the cell arrays of time t saved by save_slices."""
+    arrays = {}
+    for name in slice_arrays:
+        fname = os.path.join(folder, f'{t}_{name}.npy')
+        arrays[name] = np.load(fname, mmap_mode='r') if os.path.exists(fname) else None
+    return arrays
+
+# Compare the times filled by whole periods with the simulated ones
+def check_whole_periods(T: int, max_val: int, dim: int, number: int, is_special: bool=False):
+    """
+    Computes number with and without the whole period fill and returns the
+    list of (t, accumulate) whose cells differ, empty if they are the same.
+    The order of the cells in a space is not compared.
+    """
+    num = 2**(dim * T) - 1
+    spacetimes = []
+    for analytic in (True, False):
+        spacetime = SpaceTime(T, num, max_val, dim)
+        spacetime.analytic = analytic
+        spacetime.clear()
+        spacetime.setRationalSet(number, is_special)
+        spacetime.addRationalSet(0, 0, 0, 0)
+        spacetimes.append(spacetime)
+
+    def cells(spacetime, t, accumulate):
+        return sorted(
+            (cell['pos'], cell['count'], cell['time'], tuple(cell['next_digits']), tuple(cell['rationals']))
+            for cell in space_to_dicts(spacetime, t, accumulate)
+        )
+
+    differences = []
+    for accumulate in (False, True):
+        for t in range(max_val + 1):
+            if cells(spacetimes[0], t, accumulate) != cells(spacetimes[1], t, accumulate):
+                differences.append((t, accumulate))
+    return differences
+
+# Compile the jitclass methods used by compute, they can not be cached on disk
+def warmup():
+    """
+    Compute a tiny spacetime so that numba compiles the SpaceTime methods
+    and the array exports before the first real compute.
+    """
+    time1 = time()
+    spacetime = SpaceTime(2, 15, 4, 2)
+    spacetime.clear()
+    spacetime.setRationalSet(5, False)
+    spacetime.addRationalSet(0, 0, 0, 0)
+    for accumulate in (False, True):
+        spacetime.getMaxTime(accumulate)
+        spacetime.countPaths(2, accumulate)
+        spacetime.getCells(2, accumulate)
+        space_to_arrays(spacetime, 2, accumulate, List([1, 2]))
+    print(f'------- numba warm up in {time() - time1:.2f} secs')
+
 # Convert a list of cells to a list of dicts
 def cells_to_dicts(cells: list[Cell]):
     """Convert a list of Cell instances to a list of dicts."""
@@ -1,25 +1,158 @@
+import os
+import json
 import time
+from threading import local, Lock, get_ident
+from contextlib import contextmanager
+from functools import wraps
 
 
-last_duration = 0.0
-init_time = 0
+# cada hilo lleva su pila de spans, los totales por nombre y los contadores
+# son del proceso; los eventos solo se guardan si la traza esta activa
+_thread = local()
+_lock = Lock()
+_totals = {}
+_counters = {}
+_events = []
+_trace = {'enabled': False, 'path': ''}
+_origin = time.perf_counter()
+
+
+def _state():
+    if not hasattr(_thread, 'stack'):
+        _thread.stack = []
+        _thread.last_start = 0.0
+        _thread.last_duration = 0.0
+    return _thread
+
+
+def enable_trace(path: str) -> None:
+    """Starts recording the spans and counters of this process, save_trace writes them under path."""
+    _trace['enabled'] = bool(path)
+    _trace['path'] = path
+
+
+def _add_event(event) -> None:
+    event['pid'] = os.getpid()
+    event['tid'] = get_ident()
+    with _lock:
+        _events.append(event)
+
+
+@contextmanager
+def span(name: str, **args):
+    """Named span, nestable. Its duration goes to the totals of name and, if tracing, to the trace."""
+    state = _state()
+    start = time.perf_counter()
+    if not state.stack:
+        state.last_start = time.time()
+    state.stack.append(name)
+    try:
+        yield
+    finally:
+        state.stack.pop()
+        duration = time.perf_counter() - start
+        if not state.stack:
+            state.last_duration = duration
+        with _lock:
+            total = _totals.setdefault(name, [0, 0.0, 0.0])
+            total[0] += 1
+            total[1] += duration
+            total[2] = max(total[2], duration)
+        if _trace['enabled']:
+            _add_event({
+                'name': name, 'ph': 'X', 'cat': 'span',
+                'ts': (start - _origin) * 1e6, 'dur': duration * 1e6,
+                'args': args,
+            })
+
+
+def record(name: str, duration: float, **args) -> None:
+    """Adds a span name that ended now and lasted duration secs, for times measured before a span could be opened."""
+    end = time.perf_counter()
+    with _lock:
+        total = _totals.setdefault(name, [0, 0.0, 0.0])
+        total[0] += 1
+        total[1] += duration
+        total[2] = max(total[2], duration)
+    if _trace['enabled']:
+        _add_event({
+            'name': name, 'ph': 'X', 'cat': 'span',
+            'ts': (end - duration - _origin) * 1e6, 'dur': duration * 1e6,
+            'args': args,
+        })
+
+
+def count(name: str, value=1) -> None:
+    """Adds value to the counter name of this process (paths, cells, rationals, bytes...)."""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+        current = _counters[name]
+    if _trace['enabled']:
+        _add_event({
+            'name': name, 'ph': 'C', 'cat': 'counter',
+            'ts': (time.perf_counter() - _origin) * 1e6,
+            'args': {name: current},
+        })
+
 
 def timing(f):
+    """Decorator: a span named as the function for every call."""
+    @wraps(f)
     def wrap(*args, **kwargs):
-        global last_duration
-        global init_time
-        init_time = time.time()
-        ret = f(*args, **kwargs)
-        end_time = time.time()
-        last_duration = end_time - init_time
-        # print(f'------- {f.__name__:s}() took {last_duration:.2f} secs')
-        return ret
+        with span(f.__qualname__):
+            return f(*args, **kwargs)
     return wrap
 
+
 def get_duration():
-    global init_time
-    end_time = time.time()
-    return end_time - init_time
+    """Seconds since the outermost span of this thread started."""
+    return time.time() - _state().last_start
+
 
 def get_last_duration():
-    return last_duration
+    """Duration of the last outermost span finished in this thread."""
+    return _state().last_duration
+
+
+def get_counters() -> dict:
+    with _lock:
+        return dict(_counters)
+
+
+def get_totals() -> dict:
+    """{name: (calls, total secs, max secs)}"""
+    with _lock:
+        return {name: tuple(total) for name, total in _totals.items()}
+
+
+def reset() -> None:
+    with _lock:
+        _totals.clear()
+        _counters.clear()
+        _events.clear()
+
+
+def get_summary(num: int=3) -> str:
+    """One line with the num spans with more total time and the counters."""
+    totals = sorted(get_totals().items(), key=lambda item: -item[1][1])[:num]
+    parts = [f'{name.split(".")[-1]} {total:.2f}s/{calls}' for name, (calls, total, _) in totals]
+    parts += [f'{name} {value:,.0f}'.replace(',', '.') for name, value in get_counters().items()]
+    return ' | '.join(parts)
+
+
+def save_trace(file_name: str=None) -> str:
+    """
+    Writes the events recorded in this process as Chrome trace json
+    (chrome://tracing, Perfetto), by default trace_<pid>.json in the trace path.
+    The files of several processes can be loaded together.
+    """
+    if not _trace['enabled']:
+        return ''
+    if file_name is None:
+        os.makedirs(_trace['path'], exist_ok=True)
+        file_name = os.path.join(_trace['path'], f'trace_{os.getpid()}.json')
+    with _lock:
+        events = list(_events)
+    with open(file_name, 'wt') as fp:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, fp)
+    return file_name
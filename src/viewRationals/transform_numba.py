@@ -6,7 +6,7 @@ import numpy as np
 
 from utils_numba import *
 
-@njit
+@njit(cache=True)
 def num_ones(seq):
     """
     Gets the number of ones on each dimension of a sequence of digits.
@@ -19,12 +19,12 @@ def num_ones(seq):
     ny = 0
     nz = 0
     for d in seq:
-        nx += d % 2
-        ny += (d // 2) % 2
-        nz += (d // 4) % 2
+        nx += d & 1
+        ny += (d >> 1) & 1
+        nz += (d >> 2) & 1
     return nx, ny, nz
 
-@njit
+@njit(cache=True)
 def get_digits(m, ndigits, dim):
     """
     Gets the digits of a number in a given base.
@@ -35,22 +35,14 @@ def get_digits(m, ndigits, dim):
     Returns:
         array of digits in the given base
     """
-    base = 2**dim
-    number = base**ndigits
-    if m == 0:
-        digits = np.zeros(ndigits, dtype=np.uint8)
-        return digits
-    
+    # con base 2^dim cada digito son dim bits de m, el primero el mas alto
+    mask = 2**dim - 1
     digits = np.zeros(ndigits, dtype=np.uint8)
-    reminder = m
-    digit = (reminder * base) // number
     for i in range(ndigits):
-        digits[i] = digit
-        reminder = (reminder * base) % number
-        digit = (reminder * base) // number
+        digits[i] = (m >> (dim * (ndigits - 1 - i))) & mask
     return digits
 
-@njit
+@njit(cache=True)
 def digit_to_char_uint8(n):
     """
     Converts a digit to a uint8 character representation.
@@ -61,7 +53,7 @@ def digit_to_char_uint8(n):
     """
     return np.uint8(n)
 
-@njit
+@njit(cache=True)
 def check_output_arrays_inline(dimtr, tr_array, dimout, out_array):
     """
     Check the output plugin parameters using uint8 arrays.
@@ -86,7 +78,7 @@ def check_output_arrays_inline(dimtr, tr_array, dimout, out_array):
 
     return True
 
-@njit
+@njit(cache=True)
 def check_input_arrays_inline(dimin, input_array, dimtr, tr_array):
     """
     Check the input plugin parameters using uint8 arrays.
@@ -111,7 +103,7 @@ def check_input_arrays_inline(dimin, input_array, dimtr, tr_array):
     
     return True
 
-@njit
+@njit(cache=True)
 def create_tr_array(n):
     """
     Create transformation array for given n.
@@ -125,7 +117,7 @@ def create_tr_array(n):
         result[i] = np.uint8(i)
     return result
 
-@njit
+@njit(cache=True)
 def get_output_plugin(i, dim, dimtr, tr_array, nx, ny, nz):
     """
     Get output plugin using uint8 arrays.
@@ -149,7 +141,7 @@ def get_output_plugin(i, dim, dimtr, tr_array, nx, ny, nz):
     
     return create_uint8_array(0), False
 
-@njit
+@njit(cache=True)
 def get_input_plugin(i, dim, strdigits_array, n):
     """
     Get input plugin using uint8 arrays.
@@ -174,7 +166,7 @@ def get_input_plugin(i, dim, strdigits_array, n):
     return create_uint8_array(0), False
 
 
-@njit
+@njit(cache=True)
 def transform_input_arrays(path_array, input_array, tr_array, level=-1):
     """
     Get all the transformed paths for the input plugin using uint8 arrays.
@@ -234,7 +226,7 @@ def transform_input_arrays(path_array, input_array, tr_array, level=-1):
     
     return outpaths
 
-@njit
+@njit(cache=True)
 def transform_output_array(path_array, tr_array, out_array):
     """
     Get the transformed path for the output plugin using uint8 arrays.
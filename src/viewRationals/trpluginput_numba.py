@@ -5,7 +5,7 @@ import numpy as np
 
 from utils_numba import *
 
-@njit
+@njit(cache=True)
 def check_arrays(dimin, input_array, dimtr, tr_array):
     """
     Check the input plugin parameters using uint8 arrays.
@@ -30,7 +30,7 @@ def check_arrays(dimin, input_array, dimtr, tr_array):
     
     return True
 
-@njit
+@njit(cache=True)
 def transform_path(path_array, input_array, tr_array):
     """
     Simple path transformation function using uint8 arrays.
@@ -66,7 +66,7 @@ def transform_path(path_array, input_array, tr_array):
     
     return outpaths
 
-@njit
+@njit(cache=True)
 def transform_input_recursive(path_array, input_array, tr_array, level=-1):
     """
     Alternative transformation method with recursive-like behavior.
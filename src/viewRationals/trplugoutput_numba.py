@@ -3,7 +3,7 @@ from numba.experimental import jitclass
 
 from utils_numba import *
 
-@njit
+@njit(cache=True)
 def check_output_arrays(dimtr, tr_array, dimout, out_array):
     """
     Check the output plugin parameters using uint8 arrays.
@@ -36,7 +36,7 @@ def check_output_arrays(dimtr, tr_array, dimout, out_array):
     
     return True
 
-@njit
+@njit(cache=True)
 def transform_output(path_array, tr_array, out_array):
     """
     Transform a path using uint8 arrays.
@@ -5,6 +5,9 @@ import os
 from functools import reduce
 from copy import copy
 import subprocess
+import struct
+import zlib
+import numpy as np
 from PIL import Image
 from PyQt5 import QtGui
 from math import sqrt, pow
@@ -69,7 +72,84 @@ def make_video(
     subprocess.run(options)
     return True
 
-@njit
+def open_video_pipe(
+        ffmpeg_path: str, 
+        out_video_path: str, 
+        video_codec: str='libx264', 
+        video_format: str='mp4', 
+        frame_rate: int=25, 
+        bit_rate ='20M', 
+        image_resx: int=1920, 
+        image_resy: int=1080,
+        vflip: bool=False
+):
+    """
+    Starts ffmpeg reading raw RGBA frames from its stdin, returns the process or None.
+    vflip is for frames read bottom-up from an OpenGL framebuffer.
+    """
+    if not check_ffmpeg(ffmpeg_path):
+        print(f'------ ERROR: FFMPEG NOT FOUND, {ffmpeg_path}')
+        return None
+    options = [
+        ffmpeg_path,
+        '-y',
+        '-f', 'rawvideo',
+        '-pix_fmt', 'rgba',
+        '-s', f'{image_resx}x{image_resy}',
+        '-r', f'{frame_rate}',
+        '-i', '-',
+        *(['-vf', 'vflip'] if vflip else []),
+        '-c', video_codec,
+        '-f', video_format,
+        '-b:v', f'{bit_rate}',
+        out_video_path,
+    ]
+    print(*options)
+    return subprocess.Popen(options, stdin=subprocess.PIPE)
+
+class PngWriter:
+    """
+    Writes an RGBA png row band by row band, so images larger than the
+    memory available can be saved as they are rendered. Rows go top-down
+    and are compressed with the Up filter.
+    """
+    def __init__(self, file_name: str, width: int, height: int, level: int=6) -> None:
+        self.width = width
+        self.height = height
+        self.rows = 0
+        self.prev = np.zeros((width * 4,), dtype=np.uint8)
+        self.compressor = zlib.compressobj(level)
+        self.fp = open(file_name, 'wb')
+        self.fp.write(b'\x89PNG\r\n\x1a\n')
+        self._chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0))
+
+    def _chunk(self, kind: bytes, data: bytes) -> None:
+        self.fp.write(struct.pack('>I', len(data)))
+        self.fp.write(kind)
+        self.fp.write(data)
+        self.fp.write(struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff))
+
+    def write_rows(self, rows: np.ndarray) -> None:
+        """rows: uint8 array (n, width, 4)"""
+        rows = rows.reshape(rows.shape[0], self.width * 4)
+        data = np.empty((rows.shape[0], self.width * 4 + 1), dtype=np.uint8)
+        data[:, 0] = 2
+        data[0, 1:] = rows[0] - self.prev
+        data[1:, 1:] = rows[1:] - rows[:-1]
+        self.prev = rows[-1].copy()
+        self.rows += rows.shape[0]
+        out = self.compressor.compress(data.tobytes())
+        if out:
+            self._chunk(b'IDAT', out)
+
+    def close(self) -> None:
+        if self.rows != self.height:
+            print(f'------- ERROR: png with {self.rows} rows of {self.height}')
+        self._chunk(b'IDAT', self.compressor.flush())
+        self._chunk(b'IEND', b'')
+        self.fp.close()
+
+@njit(cache=True)
 def get_alpha(count, number, max, normalize_alpha, alpha_pow, rad_factor, rad_pow, rad_min):
     div = number
     if normalize_alpha:
@@ -164,7 +244,7 @@ def getDivisorsAndFactors(n: int, base: int) -> dict:
     divisors = {k: v for k, v in sorted(divisors.items(), key=lambda item: item[1]['number'])}
     return divisors
 
-@njit
+@njit(cache=True)
 def getPeriod(n: int, base: int) -> int:
     if n == 1:
         return 1
@@ -187,6 +267,29 @@ def getDivisorsOfPeriod(n: int, base: int):
         out.append(div)
     return out
 
+def getSpecials(dim: int, T: int) -> list[int]:
+    """Special numbers of period T in base 2^dim: divisors of a^(T/2) + 1 for even T, 2^T - 1 for odd T."""
+    a = int(2 ** dim)
+    if T % 2 == 0:
+        return divisors(a**(T // 2) + 1)
+    return [int(2)**int(T) - 1]
+
+def getFactorsLabel(factors: dict, separator: str = '_') -> str:
+    """Label of a factorization as returned by getExponentsFromFactors, e.g. 3_5^2."""
+    labels = []
+    for factor in factors.keys():
+        if factors[factor] == 0:
+            continue
+        elif factors[factor] == 1:
+            labels.append(str(factor))
+        else:
+            labels.append(str(factor) + '^' + str(factors[factor]))
+    return separator.join(labels)
+
+def getCycles(T: int) -> int:
+    """Number of periods computed by default for period T."""
+    return 4 if T < 8 else (3 if T < 17 else 2)
+
 def printDivisors():
     if len(sys.argv) != 3:
         print(f'Syntax: python utils.py <n> <base>')
@@ -18,7 +18,7 @@ def uint8_array_list_to_string_list(arr_list):
     """Convert list of uint8 arrays to list of strings."""
     return [uint8_array_to_string(arr) for arr in arr_list]
 
-@njit
+@njit(cache=True)
 def digits_to_uint8_array(digits_arr):
     """Convert digits array to uint8 array of ASCII characters."""
     result = np.zeros(len(digits_arr), dtype=np.uint8)
@@ -27,7 +27,7 @@ def digits_to_uint8_array(digits_arr):
         # result[i] = np.uint8(ord(str(digits_arr[i])))
     return result
 
-@njit
+@njit(cache=True)
 def uint8_array_to_digits(uint8_arr):
     """Convert uint8 array of ASCII characters back to digits array."""
     result = np.zeros(len(uint8_arr), dtype=np.int32)
@@ -35,17 +35,17 @@ def uint8_array_to_digits(uint8_arr):
         result[i] = int(chr(uint8_arr[i]))
     return result
 
-@njit
+@njit(cache=True)
 def create_uint8_array(size):
     """Create an empty uint8 array of given size."""
     return np.zeros(size, dtype=np.uint8)
 
-@njit
+@njit(cache=True)
 def copy_uint8_array(arr):
     """Create a copy of uint8 array."""
     return arr.copy()
 
-@njit
+@njit(cache=True)
 def uint8_arrays_equal(arr1, arr2):
     """Check if two uint8 arrays are equal."""
     if len(arr1) != len(arr2):
@@ -55,7 +55,7 @@ def uint8_arrays_equal(arr1, arr2):
             return False
     return True
 
-@njit
+@njit(cache=True)
 def count_unique_values(arr):
     """Count unique non-zero values in uint8 array."""
     unique_count = 0
@@ -66,7 +66,7 @@ def count_unique_values(arr):
             unique_count += 1
     return unique_count
 
-@njit
+@njit(cache=True)
 def find_char_in_array(char, arr):
     """Find the index of a character in uint8 array. Returns -1 if not found."""
     for i in range(len(arr)):
@@ -74,7 +74,7 @@ def find_char_in_array(char, arr):
             return i
     return -1
 
-@njit
+@njit(cache=True)
 def append_uint8_arrays(arr1, arr2):
     """Concatenate two uint8 arrays."""
     result = create_uint8_array(len(arr1) + len(arr2))
@@ -84,7 +84,7 @@ def append_uint8_arrays(arr1, arr2):
         result[len(arr1) + i] = arr2[i]
     return result
 
-@njit
+@njit(cache=True)
 def slice_uint8_array(arr, start, end):
     """Create a slice of uint8 array from start to end."""
     if end > len(arr):
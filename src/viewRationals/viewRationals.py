@@ -1,8 +1,12 @@
+import numbaCache
 import os
 import sys
-from time import time, sleep
+from time import time
+start_time = time()
+import tempfile
+from time import sleep
 from multiprocessing import freeze_support, Manager
-from threading import Thread
+from threading import Thread, Event
 from copy import deepcopy
 from multiprocessing import managers
 import numpy as np
@@ -16,19 +20,13 @@ from PyQt5.QtCore import Qt
 from madcad import vec3, settings
 from mainWindowUi import MainWindowUI
 from views import Views
-from saveSpecials import SaveSpecialsWidget
-from saveVideo import SaveVideoWidget
-from getObjects import get_objects
-from spacetime_numba import SpaceTime, space_to_dicts, spacetime_to_dicts
+from spacetime_numba import SpaceTime, space_to_arrays, save_slices, warmup, memory_report, estimate_memory, fit_max_time, available_memory
 from cell_numba import Cell
-from utils import getDivisorsAndFactors, divisors
-from timing import timing, get_duration
+from utils import getDivisorsAndFactors, getSpecials, getFactorsLabel, getCycles
+from timing import timing, get_duration, span, count, record, get_summary, enable_trace, save_trace
 from config import config
 from color import ColorLine, _convert_color
-from histogram import Histogram
-from saveImages import _saveImages, _create_video
-from transform_numba import Transform
-from transformWidget import TransformWidget
+from objectsCache import ObjectsCache, ObjectsPrefetcher
 
 
 settings_file = r'settings.txt'
@@ -36,7 +34,7 @@ opengl_version = (3,3)
 
 
 class VideoThread(Thread):
-    def __init__(self, parent, func_process, args_process, func_video, single_image):
+    def __init__(self, parent, func_process, args_process, func_video, single_image, cancel_event=None):
         super().__init__()
         self.parent = parent
         self.func_process = func_process
@@ -45,6 +43,7 @@ class VideoThread(Thread):
         self.processes = None
         self.killed = False
         self.single_image = single_image
+        self.cancel_event = cancel_event
     
     def run(self):
         self.parent.statusLabel.setFont(QtGui.QFont('Courier'))
@@ -59,6 +58,9 @@ class VideoThread(Thread):
             self.parent.setStatus(f'Image saved for number {int(self.parent.number.value()):d} in {get_duration():.2f} secs')
         self.parent.statusLabel.setFont(QtGui.QFont('Arial'))
         self.parent.shr_num_video_frames.value = -1
+        if getattr(self, 'processes', None):
+            from saveImages import _del_folder
+            _del_folder(self.processes[2])
         del self.args_process
         if not self.killed:
             del self.processes
@@ -67,12 +69,19 @@ class VideoThread(Thread):
         collect()
 
     def kill(self):
+        if self.cancel_event and not getattr(self, 'processes', None):
+            # todavia se estan creando los frames, el export se para y guarda su progreso
+            self.parent.setStatus('CANCELLING VIDEO CREATION...')
+            self.killed = True
+            self.cancel_event.set()
         if self.processes:
             self.parent.setStatus('CANCELLED VIDEO CREATION...')
             self.killed = True
             self.processes[0].terminate()
             self.processes[0].close()
             self.processes[0].join()
+            from saveImages import _del_folder
+            _del_folder(self.processes[2])
             self.parent.timer_video.stop()
             del self.processes
             collect()
@@ -88,6 +97,7 @@ class MainWindow(QtWidgets.QMainWindow):
         self.cell_ids = {}
         self.selected = {}
         self.selected_rationals = []
+        self.selection_key = None
         self.selected_center = None
         self.selected_time = None
         self.view_selected_rationals = False
@@ -106,8 +116,7 @@ class MainWindow(QtWidgets.QMainWindow):
         self.view_objects = True
         self.view_time = False
         self.view_next_number = False
-        self.spacetime: SpaceTime = SpaceTime(2, 3, 2, 1)
-        self.transform: Transform = Transform()
+        self._spacetime: SpaceTime = None
         self.video_thread = None
         self.factors = ''
         self.num = 0
@@ -116,11 +125,43 @@ class MainWindow(QtWidgets.QMainWindow):
         self.color = None
         self.statusLabel.setFont(QtGui.QFont('Arial'))
         self.files_path = self.config.get('files_path')
+        self.objects_cache = ObjectsCache(self.config.get('objects_cache_size'))
+        self.prefetcher = ObjectsPrefetcher(self.objects_cache, self._build_objects)
+        self.prefetcher.start()
         self.loadConfigColors()
+        self.summaryLabel = QtWidgets.QLabel()
+        self.statusBar.addPermanentWidget(self.summaryLabel)
+        self.timer_summary = QtCore.QTimer(self)
+        self.timer_summary.timeout.connect(self.update_summary)
+        self.timer_summary.start(1000)
         self._clear_parameters()
         self.showMaximized()
         settings.display['background_color'] = vec3(*_convert_color(config.get('background_color')))
 
+    @property
+    def spacetime(self) -> SpaceTime:
+        # se crea al usarlo por primera vez, instanciar SpaceTime compila la clase
+        if self._spacetime is None:
+            self._spacetime = SpaceTime(2, 3, 2, 1)
+        return self._spacetime
+
+    @spacetime.setter
+    def spacetime(self, spacetime: SpaceTime):
+        self._spacetime = spacetime
+
+    def first_shown(self):
+        """Called once the main window is on screen, starts the deferred initialisation."""
+        duration = time() - start_time
+        # desde el inicio del proceso, queda en los totales y en la traza
+        record('startup', duration)
+        self.setStatus(f'Main window shown in {duration:.2f} secs')
+        self.update_summary()
+        # numba compila los metodos de SpaceTime mientras se elige un numero
+        Thread(target=warmup, daemon=True).start()
+
+    def update_summary(self):
+        self.summaryLabel.setText(get_summary())
+
     def loadConfigColors(self):
         self.color = ColorLine()
         colors = self.config.get('colors')
@@ -260,7 +301,7 @@ class MainWindow(QtWidgets.QMainWindow):
 
     def saveVideo(
             self, init_frame=0, end_frame=0, subfolder='', prefix='', suffix='', num_frames=0, fps=1.0, turn_angle=0, 
-            clean_images=True, legend=True, num_cpus=8, resx=1920, resy=1080
+            clean_images=True, legend=True, num_cpus=8, resx=1920, resy=1080, stream=False, resume=False
         ):
         if self.views.mode not in ['1D', '2D', '3D']:
             QtWidgets.QMessageBox.critical(self, 'ERROR', 'Split 3D view is not allowed for videos')
@@ -273,20 +314,10 @@ class MainWindow(QtWidgets.QMainWindow):
         app.setOverrideCursor(QtCore.Qt.WaitCursor)
         image_path = self.config.get('image_path')
         frame_rate = fps
-        single_image = False
-        if num_frames == 1:
-            single_image = True
-        if num_frames == 0:
-            if end_frame == 0:
-                num_frames = int(self.maxTime.value() * frame_rate)
-            else:
-                num_frames = int((end_frame - init_frame + 1) * frame_rate)
-        if end_frame == 0:
-            end_frame = int(self.maxTime.value())
-        if self._check_accumulate() and turn_angle == 0 and num_frames > 1:
-            init_frame = 0
-            end_frame = 6
-            num_frames = 6
+        from saveImages import _saveImages, _create_video, _get_frame_range
+        init_frame, end_frame, num_frames, single_image = _get_frame_range(
+            init_frame, end_frame, num_frames, frame_rate, int(self.maxTime.value()), self._check_accumulate(), turn_angle
+        )
 
         manager = Manager()
         projection = self.views.views[self.views.mode].view.projection
@@ -296,10 +327,15 @@ class MainWindow(QtWidgets.QMainWindow):
         self.num_video_frames = 0
         self.max_video_frames = deepcopy(num_frames)
         self.shr_num_video_frames = manager.Value(int, self.num_video_frames)
+        cancel_event = Event()
 
-        spacetime = spacetime_to_dicts(self.spacetime, self._check_accumulate())
-
-        selected_rationals = [int(x) for x in self.selected_rationals]
+        # las celdas de cada tiempo se guardan una vez en ficheros que los
+        # procesos de render mapean en memoria, solo los tiempos del video
+        rationals = self.selected_rationals if self.selected_rationals else None
+        slices_path = tempfile.mkdtemp(prefix='viewRationals_')
+        last_frame = min(end_frame + 1, int(self.maxTime.value()))
+        with span('save_slices'):
+            count('bytes_slices', save_slices(self.spacetime, self._check_accumulate(), rationals, slices_path, range(init_frame, last_frame + 1)))
 
         args = (
             shr_projection,
@@ -316,8 +352,7 @@ class MainWindow(QtWidgets.QMainWindow):
             config,
             self.color,
             self.views.views[self.views.mode].type,
-            spacetime,
-            selected_rationals,
+            slices_path,
             self.dim,
             self.number.value(),
             self.period.value(),
@@ -335,12 +370,15 @@ class MainWindow(QtWidgets.QMainWindow):
             num_cpus,
             legend,
             resx,
-            resy
+            resy,
+            stream,
+            resume,
+            cancel_event
         )
 
         self.timer_video_count = 0
         self.timer_video.start(1000)
-        self.video_thread = VideoThread(self, _saveImages, args, _create_video, single_image)
+        self.video_thread = VideoThread(self, _saveImages, args, _create_video, single_image, cancel_event)
         self.video_thread.start()
 
         app.restoreOverrideCursor()
@@ -369,6 +407,7 @@ class MainWindow(QtWidgets.QMainWindow):
         self.view_selected_rationals = not self.view_selected_rationals
         if not self.view_selected_rationals:
             self.selected_rationals = List.empty_list(int32)
+        self._update_selection_key()
         if self.histogram:
             self.histogram.set_rationals(self.selected_rationals)
         if self.views:
@@ -380,6 +419,7 @@ class MainWindow(QtWidgets.QMainWindow):
         print(f'Selecting cell {cell.x} {cell.y} {cell.z} at time {self.time.value()}')
         self.selected_rationals = cell.get_rationals()
         print(f'Selected rationals: {len(self.selected_rationals)}')
+        self._update_selection_key()
         self.view_selected_rationals = True
         if self.views:
             self.draw_objects()
@@ -388,6 +428,12 @@ class MainWindow(QtWidgets.QMainWindow):
             self.histogram.clear()
             self.histogram.set_rationals(self.selected_rationals)
 
+    def _update_selection_key(self):
+        if not self.selected_rationals:
+            self.selection_key = None
+        else:
+            self.selection_key = hash(tuple(int(x) for x in self.selected_rationals))
+
     def select_center(self, x, y=0, z=0):
         self.selected_center = (x, y, z)
         self.selected_time = self.timeWidget.value()
@@ -516,6 +562,12 @@ class MainWindow(QtWidgets.QMainWindow):
         n = int(self.number.value())
         num = 2**(self.dim*self.period.value()) - 1
 
+        self._invalidate_objects()
+
+        if self.changed_spacetime and not self.check_memory(n):
+            app.restoreOverrideCursor()
+            return
+
         if self.changed_spacetime:
             self.setStatus('Creating incremental spacetime...')
             self.spacetime.reset(self.period.value(), num, self.maxTime.value(), self.dim)
@@ -525,10 +577,15 @@ class MainWindow(QtWidgets.QMainWindow):
         self.spacetime.clear()
 
         self.setStatus(f'Setting rational set for number: {n} ...')
-        self.spacetime.setRationalSet(n, self.is_special)
+        with span('setRationalSet', number=n):
+            self.spacetime.setRationalSet(n, self.is_special)
+        count('rationals', self.spacetime.get_rational_count())
 
         self.setStatus(f'Adding rational set for number: {n}...')
-        self.spacetime.addRationalSet(0, 0, 0, 0)
+        with span('addRationalSet', number=n):
+            count('paths', self.spacetime.addRationalSet(0, 0, 0, 0))
+        report = memory_report(self.spacetime)
+        print('------- memory: ' + ', '.join(f'{name} {value / 2**20:,.1f} MB' for name, value in report.items()))
     
         self.timeWidget.setValue(self.maxTime.value() if self.period_changed else self.time.value())
         self.timeWidget.setFocus()
@@ -546,30 +603,88 @@ class MainWindow(QtWidgets.QMainWindow):
 
         app.restoreOverrideCursor()
 
-    @timing
-    def draw_objects(self, frame=0):
-        frame = self.timeWidget.value()
-        rationals = []
-        if self.view_selected_rationals and len(self.selected_rationals) > 0:
-            rationals = [int(x) for x in self.selected_rationals]
-        view_cells = space_to_dicts(self.spacetime, frame, self._check_accumulate())
-        objs, count_cells, self.cell_ids = get_objects(
-            view_cells,
-            self.number.value(),
+    def _objects_key(self, frame):
+        return (
+            frame,
+            self._check_accumulate(),
             self.dim,
+            int(self.number.value()),
+            self.view_objects,
+            self.view_time,
+            self.view_next_number,
+            self.selection_key if self.view_selected_rationals else None
+        )
+
+    def _objects_args(self, frame, max_spaces_time):
+        rationals = None
+        if self.view_selected_rationals and self.selected_rationals:
+            rationals = self.selected_rationals
+        return (
+            frame,
             self._check_accumulate(),
             rationals,
-            self.config,
-            self.color,
+            self.number.value(),
+            self.dim,
             self.view_objects,
             self.view_time,
-            self.view_next_number, 
+            self.view_next_number,
             self.maxTime.value(),
-            frame,
-            self.spacetime.getMaxTime(self._check_accumulate())
+            max_spaces_time
         )
 
+    def _build_objects(self, frame, accumulate, rationals, number, dim, 
+                       view_objects, view_time, view_next_number, max_time, max_spaces_time):
+        from getObjects import get_objects
+        with span('space_to_arrays', time=frame):
+            view_cells = space_to_arrays(self.spacetime, frame, accumulate, rationals)
+        with span('get_objects', time=frame):
+            return get_objects(
+                view_cells,
+                number,
+                dim,
+                accumulate,
+                self.config,
+                self.color,
+                view_objects,
+                view_time,
+                view_next_number, 
+                max_time,
+                frame,
+                max_spaces_time
+            )
+
+    def _get_objects(self, frame, max_spaces_time):
+        key = self._objects_key(frame)
+        result = self.objects_cache.get(key)
+        if result is None:
+            result = self._build_objects(*self._objects_args(frame, max_spaces_time))
+            self.objects_cache.put(key, result)
+        return result
+
+    def _prefetch_neighbours(self, frame, max_spaces_time):
+        """Queue the object sets of the frames around frame, and the next cycle, for background building."""
+        max_time = self.maxTime.value()
+        num = self.config.get('prefetch_frames')
+        T = self.period.value()
+        frames = [frame + i for i in range(1, num + 1)] + [frame - i for i in range(1, num + 1)]
+        frames += [(frame // T + 1) * T, (frame // T - (1 if frame % T == 0 else 0)) * T]
+        for t in frames:
+            if 0 <= t <= max_time and t != frame:
+                self.prefetcher.prefetch(self._objects_key(t), self._objects_args(t, max_spaces_time))
+
+    def _invalidate_objects(self):
+        self.prefetcher.cancel()
+        self.objects_cache.clear()
+
+    @timing
+    def draw_objects(self, frame=0):
+        frame = self.timeWidget.value()
+        max_spaces_time = self.spacetime.getMaxTime(self._check_accumulate())
+        objs, count_cells, self.cell_ids = self._get_objects(frame, max_spaces_time)
+        count('cells', count_cells)
+
         self.make_view(objs, count_cells)
+        self._prefetch_neighbours(frame, max_spaces_time)
         del objs
         result = 1
         while result:
@@ -577,25 +692,7 @@ class MainWindow(QtWidgets.QMainWindow):
 
     @timing
     def make_objects(self, frame):
-        rationals = []
-        if self.view_selected_rationals:
-            rationals = [int(x) for x in self.selected_rationals]
-        view_cells = space_to_dicts(self.spacetime, frame, self._check_accumulate())
-        objs, _, _ = get_objects(
-            view_cells,
-            self.number.value(),
-            self.dim,
-            self._check_accumulate(),
-            rationals,
-            self.config,
-            self.color,
-            self.view_objects,
-            self.view_time,
-            self.view_next_number, 
-            self.maxTime.value(),
-            frame,
-            self.spacetime.getMaxTime(self._check_accumulate())
-        )
+        objs, _, _ = self._get_objects(frame, self.spacetime.getMaxTime(self._check_accumulate()))
         return objs
 
     def make_view(self, objs=None, count_cells=0):
@@ -610,6 +707,7 @@ class MainWindow(QtWidgets.QMainWindow):
             self.first_number_set = True
             self.views.initialize(objs)
             if not self.histogram: 
+                from histogram import Histogram
                 self.histogram = Histogram(self, self.spacetime)
             self.histogram.set_number(int(self.number.value()))
             self.histogram.set_rationals(self.selected_rationals)
@@ -686,34 +784,10 @@ class MainWindow(QtWidgets.QMainWindow):
         self.turntable_angle /= 1.02
 
     def get_factors(self, number):
-        factors = self.numbers[number]['factors']
-        labels = []
-        for factor in factors.keys():
-            if factors[factor] == 0:
-                continue
-            elif factors[factor] == 1:
-                labels.append(str(factor))
-            else:
-                labels.append(str(factor) + '^' + str(factors[factor]))
-
-        if not labels:
-            labels = ['1']
-
-        label = ', '.join(labels)
-        return label
+        return getFactorsLabel(self.numbers[number]['factors'], ', ') or '1'
 
     def get_output_factors(self, number):
-        factors = self.numbers[number]['factors']
-        labels = []
-        for factor in factors.keys():
-            if factors[factor] == 0:
-                continue
-            elif factors[factor] == 1:
-                labels.append(str(factor))
-            else:
-                labels.append(str(factor) + '^' + str(factors[factor]))
-        label = '_'.join(labels)
-        return label
+        return getFactorsLabel(self.numbers[number]['factors'])
 
     def get_period_factors(self):
         self.setStatus('Computing divisors...')
@@ -723,7 +797,7 @@ class MainWindow(QtWidgets.QMainWindow):
         label = self.get_factors(list(self.numbers.keys())[-1])
         self.factorsLabel.setText(label)
         self.label_num_divisors.setText(f'{own_divisors} / {num_divisors}')
-        self.cycles = (4 if T < 8 else (3 if T < 17 else 2))
+        self.cycles = getCycles(T)
         self.timeWidget.valueChanged.disconnect(self.timeChanged)
         self.maxTime.setValue(T * self.cycles)
         self.maxTime.setSingleStep(T)
@@ -743,16 +817,9 @@ class MainWindow(QtWidgets.QMainWindow):
 
         a = int(2 ** self.dim)
         b = int(T)
-        c = int(2)
         self.numbers = getDivisorsAndFactors(a**b - 1, a)
         self.divisors.clear()
-        is_even: bool = True if T % 2 == 0 else False
-        specials = []
-        if is_even:
-            d = int(T // 2)
-            specials = divisors(a**d + 1)
-        else:
-            specials = [c**b - 1]
+        specials = getSpecials(self.dim, T)
         for record in self.numbers.values():
             x: int = record['number']
             factors: dict = record['factors']
@@ -784,6 +851,43 @@ class MainWindow(QtWidgets.QMainWindow):
         self.is_special = item.data(Qt.UserRole)
         self.number.setValue(int(item.text().split(' ', 1)[0]))
 
+    def check_memory(self, n):
+        """
+        Compares the estimated memory of the compute with the available one,
+        the user can reduce the max time, compute anyway or cancel.
+        Returns False to cancel.
+        """
+        available = available_memory()
+        if available is None:
+            return True
+        T = self.period.value()
+        max_time = self.maxTime.value()
+        limit = int(available * self.config.get('memory_limit_fraction'))
+        estimate = estimate_memory(self.dim, T, n, max_time, self.is_special)['total']
+        if estimate <= limit:
+            return True
+        fit = fit_max_time(self.dim, T, n, max_time, limit, self.is_special)
+        print(f'------- WARNING: compute needs about {estimate / 2**20:,.0f} MB, available {available / 2**20:,.0f} MB')
+        app.restoreOverrideCursor()
+        box = QtWidgets.QMessageBox(self)
+        box.setIcon(QtWidgets.QMessageBox.Warning)
+        box.setWindowTitle('Memory')
+        box.setText(
+            f'Computing number {n} up to time {max_time} needs about {estimate / 2**20:,.0f} MB '
+            f'and only {available / 2**20:,.0f} MB are available.'
+        )
+        reduce_button = None
+        if fit:
+            reduce_button = box.addButton(f'Max Time {fit}', QtWidgets.QMessageBox.AcceptRole)
+        continue_button = box.addButton('Continue', QtWidgets.QMessageBox.DestructiveRole)
+        box.addButton(QtWidgets.QMessageBox.Cancel)
+        box.exec_()
+        app.setOverrideCursor(QtCore.Qt.WaitCursor)
+        if reduce_button is not None and box.clickedButton() == reduce_button:
+            self.maxTime.setValue(fit)
+            return True
+        return box.clickedButton() == continue_button
+
     def maxTimeChanged(self):
         self.changed_spacetime = True
         self.need_compute = True
@@ -813,6 +917,7 @@ class MainWindow(QtWidgets.QMainWindow):
         self.draw_objects()
 
     def saveSpecials(self):
+        from saveSpecials import SaveSpecialsWidget
         widget = SaveSpecialsWidget(self, self.period.value(), 61)
         widget.show()
 
@@ -843,9 +948,11 @@ class MainWindow(QtWidgets.QMainWindow):
 
     def callSaveVideo(self):
         print(f'Video: ({self.config.get("image_resx")}, {self.config.get("image_resy")})')
+        from saveVideo import SaveVideoWidget
         widget = SaveVideoWidget(
             self, self.timeWidget.value(), self.maxTime.value(), self.views.mode, 
-            self.config.get('image_resx'), self.config.get('image_resy'), self.saveVideo
+            self.config.get('image_resx'), self.config.get('image_resy'), self.saveVideo,
+            self.config.get('video_stream')
         )
         widget.show()
 
@@ -883,6 +990,7 @@ class MainWindow(QtWidgets.QMainWindow):
             self.setStatus(f'Loading file {os.path.basename(in_file_name)}...')
             app.setOverrideCursor(QtCore.Qt.WaitCursor)
             self.files_path = os.path.dirname(in_file_name)
+            self._invalidate_objects()
             self.spacetime.load(in_file_name)
             T, n, max, dim, is_special = self.spacetime.getParams()
             self.dim = dim
@@ -904,6 +1012,7 @@ class MainWindow(QtWidgets.QMainWindow):
             self.setStatus(f'File {os.path.basename(in_file_name)} loaded in {time2 - time1:0.2f} segs')
 
     def applyTransform(self):
+        from transformWidget import TransformWidget
         transformWidget = TransformWidget(self.spacetime.transform, self.dim, self)
         transformWidget.show()
 
@@ -913,6 +1022,10 @@ if __name__=="__main__":
     QtWidgets.QApplication.setAttribute(Qt.AA_ShareOpenGLContexts, False)
     app = QtWidgets.QApplication(sys.argv)
     settings.load(settings_file)
+    enable_trace(config.get('trace_path'))
     mw = MainWindow()
     mw.show()
-    sys.exit(app.exec())
+    QtCore.QTimer.singleShot(0, mw.first_shown)
+    result = app.exec()
+    save_trace()
+    sys.exit(result)
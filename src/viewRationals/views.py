@@ -8,14 +8,29 @@ from PIL import Image, ImageDraw
 
 from screenView import ScreenView
 from renderView import RenderView
+from utils import PngWriter
 from timing import timing
 
 
+def default_projection(type: str):
+    if type in ['3D', '3DVIEW']:
+        return rendering.Perspective(fov=np.deg2rad(30))
+    return rendering.Orthographic()
+
+
+def default_navigation(type: str):
+    if 'LEFT' in type:
+        return rendering.Turntable(yaw=np.deg2rad(90), pitch=0)
+    elif 'TOP' in type:
+        return rendering.Turntable(yaw=0, pitch=np.deg2rad(90))
+    return rendering.Turntable(yaw=0, pitch=0)
+
+
 class ViewRender:
     def __init__(self, type: str) -> None:
         self.type = type
         self.render_scene = rendering.Scene(options=None)
-        self.render_view = RenderView(self.render_scene, share=False)
+        self.render_view = RenderView(self.render_scene, share=False, picking=False)
 
     # def __del__(self):
     #     del self.render_scene
@@ -35,6 +50,52 @@ class ViewRender:
             self.render_view.resize((resx, resy))
         img = self.render_view.render()
         return img
+
+    def render_tiled(self, resx, resy, objs, file_name, tile_size, overlays=()):
+        """
+        Renders objs tile by tile straight into the png file_name, for images
+        larger than a framebuffer. overlays are (RGBA image, left, top) drawn
+        over the render as in the non tiled images (legend, histogram).
+        """
+        self.render_scene.sync(objs)
+        writer = PngWriter(file_name, resx, resy)
+        y = 0
+        try:
+            for band in self.render_view.render_tiles((resx, resy), tile_size):
+                for overlay, left, top in overlays:
+                    self._draw_overlay(band, y, overlay, left, top)
+                writer.write_rows(band)
+                y += band.shape[0]
+        finally:
+            writer.close()
+
+    @staticmethod
+    def _draw_overlay(band, y, overlay, left, top):
+        lw, lh = overlay.size
+        r0, r1 = max(y, top), min(y + band.shape[0], top + lh)
+        if r0 >= r1:
+            return
+        lw = min(lw, band.shape[1] - left)
+        region = Image.fromarray(band[r0 - y:r1 - y, left:left + lw])
+        region.alpha_composite(overlay.crop((0, r0 - top, lw, r1 - top)))
+        band[r0 - y:r1 - y, left:left + lw] = np.asarray(region)
+
+    def fit(self, resx, resy, objs):
+        """Centers and adjusts the default camera of the view type to objs, as the screen views do."""
+        self.render_view.projection = default_projection(self.type)
+        self.render_view.navigation = default_navigation(self.type)
+        self.render_scene.sync(objs)
+        self.render_scene.dequeue()
+        self.render_view.resize((resx, resy))
+        self.render_view.center()
+        self.render_view.adjust()
+        return self.render_view.projection, self.render_view.navigation
+
+    def render_into(self, resx, resy, objs, buffer):
+        """Renders objs reading the RGBA pixels bottom-up straight into buffer."""
+        self.render_scene.sync(objs)
+        self.render_view.resize((resx, resy))
+        self.render_view.render_into(buffer)
     
     def rotate3DVideo(self, dx):
         if self.type in ['3D', '3DVIEW']:
@@ -72,18 +133,10 @@ class View(QtWidgets.QWidget):
         self.setContentsMargins(0, 0, 0, 0)
 
     def set_projection(self):
-        if self.type in ['3D', '3DVIEW']:
-            self.view.projection = rendering.Perspective(fov=np.deg2rad(30))
-        else:
-            self.view.projection = rendering.Orthographic()
+        self.view.projection = default_projection(self.type)
 
     def set_navigation(self):
-        if 'LEFT' in self.type:
-            self.view.navigation = rendering.Turntable(yaw=np.deg2rad(90), pitch=0)
-        elif 'TOP' in self.type:
-            self.view.navigation = rendering.Turntable(yaw=0, pitch=np.deg2rad(90))
-        else:
-            self.view.navigation = rendering.Turntable(yaw=0, pitch=0)
+        self.view.navigation = default_navigation(self.type)
 
     def set_active(self, active: bool):
         self.active = active
@@ -150,7 +203,7 @@ class View(QtWidgets.QWidget):
     def render(self, resx, resy, objs):
         if not self.render_view:
             self.render_scene = rendering.Scene(options=None)
-            self.render_view = RenderView(self.render_scene)
+            self.render_view = RenderView(self.render_scene, picking=False)
         projection = deepcopy(self.view.projection)
         navigation = deepcopy(self.view.navigation)
         self.render_view.projection = projection
@@ -204,13 +257,8 @@ class Views(QtWidgets.QWidget):
         self.set_mode(self.mode_3d)
 
     def init_views(self):
+        # las vistas se crean en set_mode cuando se usa su modo, cada una crea su contexto GL
         self.views = {}
-        self.views['1D'] = View('1D', self.mainWindow, parent=self.parent)
-        self.views['2D'] = View('2D', self.mainWindow, parent=self.parent)
-        self.views['3D'] = View('3D', self.mainWindow, parent=self.parent)
-        names = ['3DFRONT', '3DTOP', '3DLEFT', '3DVIEW']
-        for name in names:
-            self.views[name] = View(name, self.mainWindow, parent=self.parent)
 
     def set_mode(self, mode: str):
         if self.layout():
@@ -226,10 +274,10 @@ class Views(QtWidgets.QWidget):
             self.main_layout = QtWidgets.QVBoxLayout(self)
             self.setLayout(self.main_layout)
 
-        if mode == '3D':
+        if mode == '3D' and '3DVIEW' in self.views:
             self.navigation = deepcopy(self.views['3DVIEW'].view.navigation)
             self.projection = deepcopy(self.views['3DVIEW'].view.projection)
-        elif mode == '3DSPLIT':
+        elif mode == '3DSPLIT' and '3D' in self.views:
             self.navigation = deepcopy(self.views['3D'].view.navigation)
             self.projection = deepcopy(self.views['3D'].view.projection)
         else:
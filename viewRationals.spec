@@ -13,14 +13,18 @@ a = Analysis(
 		('.\\src\\viewRationals\\settings.txt', '.'),
 		('.\\src\\viewRationals\\config.json', '.'),
 		('.\\src\\viewRationals\\NotoMono-Regular.ttf', '.'),
+		('.\\src\\viewRationals\\*_numba.py', '.'),
+		('.\\src\\viewRationals\\utils.py', '.'),
+		('.\\src\\viewRationals\\getObjects.py', '.'),
+		('.\\src\\viewRationals\\screenView.py', '.'),
 		('C:\\Python310\\Lib\\site-packages\\madcad\\shaders\\*.*', '.\\madcad\\shaders'),
 		('C:\\Python310\\Lib\\site-packages\\madcad\\textures\\*.*', '.\\madcad\\textures'),
 		('C:\\Python310\\Lib\\site-packages\\freetype\*.*', '.\\freetype'),
 	],
-    hiddenimports=['madcad', 'glcontext', 'PyQt5', 'sip', 'numba'],
+    hiddenimports=['madcad', 'glcontext', 'PyQt5', 'sip', 'numba', 'numbaCache'],
     hookspath=['.'],
     hooksconfig={},
-    runtime_hooks=[],
+    runtime_hooks=['rthook-numba.py'],
     excludes=[],
     win_no_prefer_redirects=False,
     win_private_assemblies=False,